@@ -0,0 +1,273 @@
+import os
+import random
+import numpy as np
+
+from rules import compile_rules, load_rules
+
+# the simulation itself - no bpy in here, so it can be run / benchmarked outside of blender
+
+CELLS = {
+    "EMPTY": {"STATE": 0, "HEIGHT": 0},
+    "HOUSE": {"STATE": 1, "HEIGHT": 1},
+    "MEDIUM": {"STATE": 2, "HEIGHT": 3},
+    "SKYSCRAPER": {"STATE": 3, "HEIGHT": 6},
+    "PARK": {"STATE": 4, "HEIGHT": 0.1},
+    "POND": {"STATE": 5, "HEIGHT": 0.01},
+    "ROAD": {"STATE": 6, "HEIGHT": 0.01},
+    "ACTIVE_ROAD": {"STATE": 7, "HEIGHT": 0.01},
+}
+
+COLORS = {
+    CELLS["EMPTY"]["STATE"]: (1, 1, 1, 1), # white
+    CELLS["HOUSE"]["STATE"]: (0.8, 0.5, 0.2, 1), # brownish
+    CELLS["MEDIUM"]["STATE"]: (0.5, 0.5, 0.8, 1), # light blue
+    CELLS["SKYSCRAPER"]["STATE"]: (0.1, 0.1, 0.6, 1), # dark blue
+    CELLS["PARK"]["STATE"]: (0, 1, 0, 1), # green
+    CELLS["ROAD"]["STATE"]: (0.627, 0.322, 0.176, 1), # brown
+    CELLS["POND"]["STATE"]: (0.212, 0.616, 0.922, 1), # blue
+    CELLS["ACTIVE_ROAD"]["STATE"]: (0, 0, 0, 1), # black so that it can be easily spotted
+}
+
+N_STATES = len(CELLS)
+STATE_DTYPE = np.uint8 # 8 states, one byte per cell is plenty
+
+# per-state lookup tables, indexed with a whole state_grid at once: HEIGHTS[state_grid], COLOR_TABLE[state_grid]
+HEIGHTS = np.zeros(N_STATES, dtype=np.float32)
+for cell in CELLS.values():
+    HEIGHTS[cell["STATE"]] = cell["HEIGHT"]
+COLOR_TABLE = np.array([COLORS[state] for state in range(N_STATES)], dtype=np.float32)
+
+EMPTY = CELLS["EMPTY"]["STATE"]
+HOUSE = CELLS["HOUSE"]["STATE"]
+MEDIUM = CELLS["MEDIUM"]["STATE"]
+SKYSCRAPER = CELLS["SKYSCRAPER"]["STATE"]
+PARK = CELLS["PARK"]["STATE"]
+POND = CELLS["POND"]["STATE"]
+ROAD = CELLS["ROAD"]["STATE"]
+ACTIVE_ROAD = CELLS["ACTIVE_ROAD"]["STATE"]
+
+# forward, right, left - same order and weights as in the loop version
+ROAD_MOVES = np.array([(1, 0), (0, 1), (0, -1)])
+ROAD_WEIGHTS = np.array([0.6, 0.2, 0.2])
+ROAD_CUM_WEIGHTS = np.cumsum(ROAD_WEIGHTS)
+
+# the cell transitions (everything except the road walk) - see rules.py
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+STATE_IDS = {name: cell["STATE"] for name, cell in CELLS.items()}
+
+def make_rules(path=None):
+    return compile_rules(load_rules(path or RULES_FILE), STATE_IDS)
+
+DEFAULT_RULES = make_rules()
+
+# CounterRNG streams (RULE_STREAM - the rolls of the random rules)
+INIT_STREAM, RULE_STREAM, ROAD_STREAM = range(3)
+
+class CounterRNG:
+    # stateless random numbers: every value is a hash of (seed, step, cell index, stream).
+    # a cell gets the same number whichever other cells are drawn with it and in whatever order,
+    # so a grid split into tiles (see tiled.py) steps exactly like the whole grid
+    def __init__(self, seed=0, step=0):
+        self.seed = 0 if seed is None else seed
+        self.step = step
+
+    def at(self, step):
+        return CounterRNG(self.seed, step)
+
+    @staticmethod
+    def mix(x):
+        # splitmix64 finalizer
+        with np.errstate(over="ignore"):
+            x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            return x ^ (x >> np.uint64(31))
+
+    def keys(self, stream):
+        return self.mix(np.array([self.seed, self.step, stream], dtype=np.uint64))
+
+    def uniform(self, cells, stream):
+        key = self.keys(stream)
+        with np.errstate(over="ignore"):
+            x = np.asarray(cells, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15) + key[0]
+            x = self.mix(self.mix(x ^ key[1]) ^ key[2])
+        return (x >> np.uint64(11)) * (1.0 / 2**53)
+
+def cell_uniforms(rng, cells, stream):
+    # np.random.Generator: the next len(cells) numbers of its stream, CounterRNG: a function of the cells themselves
+    if isinstance(rng, CounterRNG):
+        return rng.uniform(cells, stream)
+    return rng.random(len(cells))
+
+def rule_params(rules=DEFAULT_RULES):
+    # what gets stored next to recorded runs
+    return {"rules": rules.spec, "road_weights": ROAD_WEIGHTS.tolist()}
+
+def step_loop(state_grid):
+    # the original per-cell Grid.step, kept as the reference implementation (and for the benchmark)
+    size = state_grid.shape[0]
+    new_grid = state_grid.copy()
+    skip = set() # :) -> prevents overwriting new ACTIVE_ROAD in the same step (as it is the new_grid that 'knows' about the ACTIVE_ROAD, not the current one (state_grid))
+
+    for i in range(size):
+        for j in range(size):
+            current_state = state_grid[i][j]
+            neighbors = [state_grid[x][y]
+                         for x in range(max(0, i - 1), min(size, i + 2))
+                         for y in range(max(0, j - 1), min(size, j + 2))
+                         if (x, y) != (i, j)]
+
+            if (i, j) in skip:
+                continue
+
+            if current_state == CELLS["ACTIVE_ROAD"]["STATE"]:
+                x, y = random.choices([(i+1, j), (i, j+1), (i, j-1)], [0.6, 0.2, 0.2])[0]
+                if 0 <= x < size and 0 <= y < size:
+                    new_grid[i][j] = CELLS["ROAD"]["STATE"]
+                    new_grid[x][y] = CELLS["ACTIVE_ROAD"]["STATE"]
+                    skip.add((x, y))
+            elif (current_state == CELLS["EMPTY"]["STATE"] or current_state == CELLS["PARK"]["STATE"]) and (CELLS["ROAD"]["STATE"] in neighbors or CELLS["ACTIVE_ROAD"]["STATE"] in neighbors):
+                if random.random() < 0.5:
+                    new_grid[i][j] = CELLS["HOUSE"]["STATE"]
+            elif current_state == CELLS["HOUSE"]["STATE"] and neighbors.count(CELLS["HOUSE"]["STATE"]) > 2:
+                new_grid[i][j] = CELLS["MEDIUM"]["STATE"]
+            elif current_state == CELLS["MEDIUM"]["STATE"] and neighbors.count(CELLS["MEDIUM"]["STATE"]) > 1:
+                new_grid[i][j] = CELLS["SKYSCRAPER"]["STATE"]
+            elif current_state == CELLS["SKYSCRAPER"]["STATE"] and neighbors.count(CELLS["SKYSCRAPER"]["STATE"]) > 2:
+                new_grid[i][j] = CELLS["MEDIUM"]["STATE"]
+            elif current_state == CELLS["EMPTY"]["STATE"] and neighbors.count(CELLS["PARK"]["STATE"]) > 2:
+                new_grid[i][j] = CELLS["PARK"]["STATE"]
+            elif current_state == CELLS["PARK"]["STATE"] and neighbors.count(CELLS["PARK"]["STATE"]) > 7:
+                new_grid[i][j] = CELLS["POND"]["STATE"]
+            elif current_state == CELLS["POND"]["STATE"] and (neighbors.count(CELLS["PARK"]["STATE"]) + neighbors.count(CELLS["POND"]["STATE"])) < 8:
+                new_grid[i][j] = CELLS["PARK"]["STATE"]
+
+    return new_grid
+
+def neighbor_counts(state_grid):
+    # counts[s, i, j] = how many of the 8 neighbors of (i, j) are in state s
+    # the grid is padded with an extra 'outside' state that is never counted,
+    # so border cells just have fewer neighbors - same as the range clipping in the loop version
+    size_x, size_y = state_grid.shape
+    padded = np.full((size_x + 2, size_y + 2), N_STATES, dtype=state_grid.dtype)
+    padded[1:-1, 1:-1] = state_grid
+
+    # one-hot planes, one per state
+    planes = padded[None, :, :] == np.arange(N_STATES, dtype=state_grid.dtype)[:, None, None]
+    planes = planes.astype(np.uint8)
+
+    counts = np.zeros((N_STATES, size_x, size_y), dtype=np.uint8)
+    for dx in range(3):
+        for dy in range(3):
+            if (dx, dy) != (1, 1):
+                counts += planes[:, dx:dx + size_x, dy:dy + size_y]
+    return counts
+
+def apply_rules(state_grid, counts, rng, origin=(0, 0), width=None, cells=None, rules=DEFAULT_RULES, return_waiting=False):
+    # all the non-road transitions, looked up in the compiled rule table (first matching rule wins, like the elif chain)
+    # origin/width - where state_grid sits in the full grid, when it's only a tile of it
+    # cells - flat indices in the full grid, when state_grid is a scattered 1d selection of cells
+    # return_waiting - also return the cells that lost the roll of a random rule (they can still change next step)
+    def draw(positions):
+        if cells is not None:
+            rolled_cells = cells[positions]
+        else:
+            rows, cols = np.divmod(positions, state_grid.shape[1])
+            rolled_cells = (rows + origin[0]) * (width or state_grid.shape[1]) + cols + origin[1]
+        return cell_uniforms(rng, rolled_cells, RULE_STREAM)
+
+    new_grid, waiting = rules.evaluate(state_grid, counts, draw)
+    return (new_grid, waiting) if return_waiting else new_grid
+
+class RoadAgents:
+    # the ACTIVE_ROAD heads, kept as a sorted array of flat indices into the grid,
+    # so a step costs O(active roads) instead of scanning the whole grid for them
+    def __init__(self, heads, shape):
+        self.heads = np.asarray(heads, dtype=np.int64)
+        self.shape = shape
+
+    @classmethod
+    def from_grid(cls, state_grid):
+        return cls(np.flatnonzero(state_grid == ACTIVE_ROAD), state_grid.shape)
+
+    def __len__(self):
+        return len(self.heads)
+
+    def draw_moves(self, rng):
+        # same as random.choices(moves, ROAD_WEIGHTS) for every head at once
+        u = cell_uniforms(rng, self.heads, ROAD_STREAM) * ROAD_CUM_WEIGHTS[-1]
+        return ROAD_MOVES[np.searchsorted(ROAD_CUM_WEIGHTS, u, side="right").clip(max=len(ROAD_MOVES) - 1)]
+
+    def advance(self, new_grid, rng):
+        size_x, size_y = self.shape
+        rows, cols = np.divmod(self.heads, size_y)
+        moves = self.draw_moves(rng)
+        x, y = rows + moves[:, 0], cols + moves[:, 1]
+        in_bounds = (0 <= x) & (x < size_x) & (0 <= y) & (y < size_y)
+        targets = x * size_y + y
+
+        # collisions: a head is stuck if a head before it (row-major order, like in the loop version)
+        # already moved onto its cell - it just merges into that one. only forward/right moves can
+        # block a later head, so this is a single pass over the heads
+        moved = in_bounds.copy()
+        skip = set()
+        for k, (head, target, ok) in enumerate(zip(self.heads.tolist(), targets.tolist(), in_bounds.tolist())):
+            if head in skip:
+                moved[k] = False
+            elif ok:
+                skip.add(target)
+
+        # ROAD first, ACTIVE_ROAD second - a cell left by one head and entered by another stays active
+        new_grid.flat[self.heads[moved]] = ROAD
+        new_grid.flat[targets[moved]] = ACTIVE_ROAD
+
+        self.heads = np.unique(np.where(moved, targets, self.heads))
+        return new_grid
+
+def step_vectorized(state_grid, rng, roads=None, rules=DEFAULT_RULES):
+    # same rules as step_loop (with the default rules.json), but the neighbor counts for the whole grid are computed in one go
+    # pass the same RoadAgents every step to avoid looking the heads up in the grid again
+    if roads is None:
+        roads = RoadAgents.from_grid(state_grid)
+    counts = neighbor_counts(state_grid)
+    new_grid = apply_rules(state_grid, counts, rng, rules=rules)
+    return roads.advance(new_grid, rng)
+
+def initial_grid(size, rng):
+    # 75% empty, the rest parks, plus three road heads on the first row
+    state_grid = initial_cells(rng, np.arange(size * size)).reshape(size, size)
+    state_grid.flat[initial_roads(size)] = ACTIVE_ROAD
+    return state_grid
+
+def initial_cells(rng, cells):
+    return np.where(cell_uniforms(rng, cells, INIT_STREAM) < 0.75, EMPTY, PARK).astype(STATE_DTYPE)
+
+def initial_roads(size):
+    return np.array([int(size*1/4), size // 2, int(size*3/4)])
+
+class CitySimulation:
+    # the whole automaton without any rendering - backends (see backends.py) only read state_grid
+    def __init__(self, size, seed=None, rng=None, rules=DEFAULT_RULES):
+        # rng - an np.random.Generator (e.g. from SeedSequence.spawn) or a CounterRNG to use instead of one made from seed
+        # rules - compiled transitions, e.g. make_rules("other_rules.json")
+        self.size = size
+        self.seed = seed
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        self.rules = rules
+        self.state_grid = initial_grid(size, self.rng)
+        self.roads = RoadAgents.from_grid(self.state_grid)
+        self.step_count = 0
+        self.changed_per_step = [] # how sparse the updates really are
+
+    def step(self):
+        # returns the flat indices of the cells that changed, so the renderers can skip the rest
+        new_grid = step_vectorized(self.state_grid, self.step_rng(), self.roads, self.rules)
+        changed = np.flatnonzero(new_grid != self.state_grid)
+        self.state_grid = new_grid
+        self.step_count += 1
+        self.changed_per_step.append(len(changed))
+        return changed
+
+    def step_rng(self):
+        if isinstance(self.rng, CounterRNG):
+            return self.rng.at(self.step_count)
+        return self.rng
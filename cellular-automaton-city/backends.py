@@ -0,0 +1,55 @@
+import profiling
+
+# renderers for CitySimulation
+# run() drives the simulation and hands every state to a backend, the simulation itself never touches them
+
+class Backend:
+    def setup(self, simulation):
+        pass
+
+    def update(self, state_grid, frame, changed=None):
+        # changed - flat indices of the cells that differ from the previous update, None for the first one
+        pass
+
+    def finish(self, frame_end):
+        pass
+
+class NullBackend(Backend):
+    # headless - for benchmarks and parameter sweeps
+    pass
+
+class TeeBackend(Backend):
+    # hands every call to several backends, e.g. a renderer and a history recorder
+    def __init__(self, *backends):
+        self.backends = backends
+
+    def setup(self, simulation):
+        for backend in self.backends:
+            backend.setup(simulation)
+
+    def update(self, state_grid, frame, changed=None):
+        for backend in self.backends:
+            backend.update(state_grid, frame, changed)
+
+    def finish(self, frame_end):
+        for backend in self.backends:
+            backend.finish(frame_end)
+
+def run(simulation, backend, total_steps, frame_start=1, frame_duration=12):
+    profiler = profiling.active()
+    with profiler.phase("setup"):
+        backend.setup(simulation)
+
+    changed = None
+    for step in range(total_steps):
+        frame = frame_start + step * frame_duration
+        with profiler.phase("update"):
+            backend.update(simulation.state_grid, frame, changed)
+        with profiler.phase("step"):
+            changed = simulation.step()
+        profiler.record_step(step, changed)
+
+    frame_end = frame_start + total_steps * frame_duration - 1
+    with profiler.phase("finish"):
+        backend.finish(frame_end)
+    return frame_end
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+import resource
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import bpy
+from automaton import CitySimulation
+from blender_backend import BACKENDS
+
+# build time / memory of the blender backends, has to be run inside blender:
+# blender -b --python bench_render.py -- --sizes 30 100 300 --modes mesh objects
+
+def rss_mb():
+    # current resident memory, falls back to the peak where /proc isn't available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def clear_scene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for material in list(bpy.data.materials):
+        bpy.data.materials.remove(material)
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 300])
+    parser.add_argument("--modes", nargs="+", default=["mesh", "objects"], choices=list(BACKENDS))
+    parser.add_argument("--updates", type=int, default=5, help="updates timed after the build")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':>8} {'size':>6} {'build s':>9} {'update s':>9} {'memory MB':>10}")
+    for mode in args.modes:
+        for size in args.sizes:
+            clear_scene()
+            simulation = CitySimulation(size, seed=0)
+            backend = BACKENDS[mode]()
+
+            before = rss_mb()
+            start = time.perf_counter()
+            backend.setup(simulation)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for step in range(args.updates):
+                backend.update(simulation.state_grid, 1 + step)
+                simulation.step()
+            update = (time.perf_counter() - start) / args.updates
+
+            print(f"{mode:>8} {size:>6} {build:>9.3f} {update:>9.3f} {rss_mb() - before:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import random
+import time
+import numpy as np
+
+from automaton import RoadAgents, initial_grid, step_loop, step_vectorized
+
+# python bench_step.py --sizes 30 100 300 1000
+# compares steps/sec of the original per-cell loop with the vectorized engine
+
+def steps_per_sec(step, grid, steps):
+    grid = step(grid) # warm-up, the first call pays for numpy's lazy imports
+    start = time.perf_counter()
+    for _ in range(steps):
+        grid = step(grid)
+    return steps / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 300])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--loop-max-size", type=int, default=300, help="the loop version is skipped for bigger grids (way too slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'size':>6} {'loop steps/s':>14} {'vectorized steps/s':>20} {'speedup':>9}")
+    for size in args.sizes:
+        grid = initial_grid(size, rng)
+        roads = RoadAgents.from_grid(grid)
+        vectorized = steps_per_sec(lambda g: step_vectorized(g, rng, roads), grid, args.steps)
+        if size <= args.loop_max_size:
+            loop = steps_per_sec(step_loop, grid, args.steps)
+            print(f"{size:>6} {loop:>14.2f} {vectorized:>20.2f} {vectorized / loop:>8.1f}x")
+        else:
+            print(f"{size:>6} {'-':>14} {vectorized:>20.2f} {'-':>9}")
+
+if __name__ == "__main__":
+    main()
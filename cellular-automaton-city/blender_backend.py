@@ -0,0 +1,334 @@
+import bpy
+from bpy.app.handlers import persistent
+import numpy as np
+
+import profiling
+from automaton import CELLS, COLOR_TABLE, HEIGHTS
+from backends import Backend
+
+# the profiling counters ("rna.*") count calls into blender's RNA - property reads/writes/subscripts ("rna.property"),
+# keyframe_insert, foreach_set, frame_set, operators ("rna.ops") and all the other RNA functions ("rna.data") -
+# so the python side of a backend can be compared call for call.
+# they're counted as they happen: everything a backend does in blender goes through _rna(), which with profiling
+# on wraps the object in a proxy that counts each access it passes on (and the objects it hands out are wrapped too).
+# with profiling off _rna() returns the object itself. the proxy adds its own overhead to the timings of a profiled run
+
+_CONSTANT = 0 # 'CONSTANT' in the keyframe interpolation enum
+
+_COUNTED_CALLS = {"keyframe_insert", "foreach_set", "frame_set"} # counted under their own name, not as "rna.data"
+_PLAIN = (bool, int, float, str, bytes, type(None), np.ndarray) # python values, not wrapped
+
+class _Counted:
+    # target - the blender object (or method, operator), name - the attribute it was read as, ops - part of bpy.ops
+    # (only the operator calls count there, the rest is python)
+    __slots__ = ("_target", "_name", "_ops")
+
+    def __init__(self, target, name=None, ops=False):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_ops", ops)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if callable(value): # a function, counted when it's called
+            return _Counted(value, name, self._ops)
+        if not self._ops:
+            profiling.active().count("rna.property")
+        return _wrap(value, self._ops)
+
+    def __setattr__(self, name, value):
+        profiling.active().count("rna.property")
+        setattr(self._target, name, _raw(value))
+
+    def __getitem__(self, key):
+        profiling.active().count("rna.property")
+        return _wrap(self._target[key], self._ops)
+
+    def __call__(self, *args, **kwargs):
+        kind = "ops" if self._ops else self._name if self._name in _COUNTED_CALLS else "data"
+        profiling.active().count(f"rna.{kind}")
+        return _wrap(self._target(*map(_raw, args), **{key: _raw(value) for key, value in kwargs.items()}), self._ops)
+
+def _wrap(value, ops=False):
+    return value if isinstance(value, _PLAIN) else _Counted(value, ops=ops)
+
+def _raw(value):
+    # what's kept between calls has to be the blender object, a proxy would go on counting into an old profiler
+    return value._target if isinstance(value, _Counted) else value
+
+def _rna(value):
+    if not profiling.active().enabled:
+        return value
+    return _Counted(value, ops=value is bpy.ops)
+
+def _write_fcurve(action, data_path, index, frames, values, interpolation=None):
+    # all the keyframes of one F-curve in a single foreach_set instead of one keyframe_insert each
+    fcurve = action.fcurves.new(data_path, index=index)
+    fcurve.keyframe_points.add(len(frames))
+    co = np.empty(2 * len(frames), dtype=np.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    fcurve.keyframe_points.foreach_set("co", co)
+    if interpolation is not None:
+        fcurve.keyframe_points.foreach_set("interpolation", np.full(len(frames), interpolation, dtype=np.int32))
+    fcurve.update()
+    return fcurve
+
+class ObjectGridBackend(Backend):
+    # one cube object + one material per cell
+    # bake=False: the changed cells are keyframed on every update
+    # bake=True: the changes are only recorded and finish() writes the F-curves in bulk
+    def __init__(self, bake=False):
+        self.bake = bake
+
+    def setup(self, simulation):
+        self.size = simulation.size
+        self.frames = []
+        self.shown = None # the state at the last update
+        self.events = [] # bake=True: (update index, changed cells, their new states) for every update after the first
+        self.object_grid = np.zeros((self.size, self.size), dtype=object)
+        ops, context, data = _rna(bpy.ops), _rna(bpy.context), _rna(bpy.data)
+
+        for i in range(self.size):
+            for j in range(self.size):
+                ops.mesh.primitive_cube_add(size=1, location=(i, j, 0))
+                obj = context.object
+                obj.name = f"GridCube_{i}_{j}"
+                self.object_grid[i, j] = _raw(obj)
+
+                # materials
+                # https://blender.stackexchange.com/questions/297185/keyframing-objects-active-material-color-using-python-api <33
+                material = data.materials.new(name=f"CubeMaterial_{i}_{j}")
+                material.use_nodes = True
+                bsdf = material.node_tree.nodes.get("Principled BSDF")
+                bsdf.inputs['Base Color'].default_value = (1, 1, 1, 1) # set a default color
+                obj.data.materials.append(material) # assign the material to the object
+
+    def update(self, state_grid, frame, changed=None):
+        # changed = flat indices of the cells that differ from the previous update (None -> work it out)
+        if changed is None and self.shown is not None:
+            changed = np.flatnonzero(state_grid.ravel() != self.shown.ravel())
+
+        if self.bake:
+            if self.shown is None:
+                self.initial = state_grid.copy()
+            else:
+                self.events.append((len(self.frames), changed, state_grid.ravel()[changed]))
+        else:
+            profiler = profiling.active()
+            with profiler.phase("frame_set"):
+                _rna(bpy.context).scene.frame_set(frame)
+
+            if changed is None:
+                cells = np.arange(self.size * self.size)
+            else:
+                # only the changed cells get keys, so the old value has to be held until the previous update
+                # (otherwise the change would be interpolated all the way from the cell's last key)
+                cells = changed
+                with profiler.phase("keyframes"):
+                    self.show_cells(cells, self.shown.ravel()[cells], self.frames[-1])
+
+            with profiler.phase("keyframes"):
+                self.show_cells(cells, state_grid.ravel()[cells], frame)
+
+        self.frames.append(frame)
+        self.shown = state_grid.copy()
+
+    def show_cells(self, cells, states, frame):
+        # everything per cell comes out of the lookup tables in one gather, the loop only assigns
+        heights = HEIGHTS[states].tolist()
+        colors = COLOR_TABLE[states].tolist()
+        hidden = (states == CELLS["EMPTY"]["STATE"]).tolist()
+        rows, cols = np.divmod(cells, self.size)
+
+        for obj, i, j, height, color, hide in zip(map(_rna, self.object_grid.ravel()[cells]), rows.tolist(), cols.tolist(), heights, colors, hidden):
+            obj.hide_viewport = hide
+            obj.scale = (1, 1, height)
+            obj.location = (i, j, height/2)
+
+            # set the base color for the material and keyframe it
+            material = obj.data.materials[0] # get the material assigned to the object
+            bsdf = material.node_tree.nodes['Principled BSDF']
+            base_color = bsdf.inputs['Base Color']
+            base_color.default_value = color
+
+            # keyframe the base color
+            base_color.keyframe_insert(data_path="default_value", frame=frame)
+
+            # keyframe other properties
+            obj.keyframe_insert(data_path="scale", frame=frame)
+            obj.keyframe_insert(data_path="location", frame=frame)
+            obj.keyframe_insert(data_path="hide_viewport", frame=frame)
+
+    def bake_keys(self):
+        # (cell, update index, state) of every key, sorted by cell and then by update
+        # built from the recorded changes only, the full (steps, cells) history never exists
+        n_cells = self.size * self.size
+        cells = [np.arange(n_cells)] + [changed for _, changed, _ in self.events]
+        steps = [np.zeros(n_cells, dtype=np.int64)] + [np.full(len(changed), step) for step, changed, _ in self.events]
+        states = [self.initial.ravel()] + [new_states for _, _, new_states in self.events]
+        cells, steps, states = np.concatenate(cells), np.concatenate(steps), np.concatenate(states)
+        order = np.lexsort((steps, cells))
+        cells, steps, states = cells[order], steps[order], states[order]
+
+        # a key one update before every change, so the old value is held until then
+        # (otherwise bezier interpolation would blend between two changes far apart)
+        change = cells[1:] == cells[:-1]
+        cells = np.concatenate([cells, cells[1:][change]])
+        steps = np.concatenate([steps, steps[1:][change] - 1])
+        states = np.concatenate([states, states[:-1][change]])
+
+        # a hold key can land on an existing key (two changes in a row) - same value, keep one
+        _, unique = np.unique(cells * len(self.frames) + steps, return_index=True)
+        return cells[unique], steps[unique], states[unique]
+
+    def bake_animation(self):
+        frames = np.array(self.frames, dtype=np.float32)
+        cells, steps, states = self.bake_keys()
+        bounds = np.searchsorted(cells, np.arange(self.size * self.size + 1))
+        data = _rna(bpy.data)
+
+        for cell, obj in enumerate(map(_rna, self.object_grid.ravel())):
+            key_frames = frames[steps[bounds[cell]:bounds[cell + 1]]]
+            cell_states = states[bounds[cell]:bounds[cell + 1]]
+            heights = HEIGHTS[cell_states]
+
+            obj.location.z = heights[0] / 2
+            obj.animation_data_create()
+            obj.animation_data.action = data.actions.new(name=f"{obj.name}_Action")
+            _write_fcurve(obj.animation_data.action, "scale", 2, key_frames, heights)
+            _write_fcurve(obj.animation_data.action, "location", 2, key_frames, heights / 2)
+            _write_fcurve(obj.animation_data.action, "hide_viewport", 0, key_frames, cell_states == CELLS["EMPTY"]["STATE"], _CONSTANT)
+
+            node_tree = obj.data.materials[0].node_tree
+            base_color = node_tree.nodes['Principled BSDF'].inputs['Base Color']
+            data_path = base_color.path_from_id("default_value")
+            node_tree.animation_data_create()
+            node_tree.animation_data.action = data.actions.new(name=f"{obj.name}_ColorAction")
+            colors = COLOR_TABLE[cell_states]
+            for channel in range(4):
+                _write_fcurve(node_tree.animation_data.action, data_path, channel, key_frames, colors[:, channel])
+
+    def finish(self, frame_end):
+        if self.bake and self.frames:
+            with profiling.active().phase("bake"):
+                self.bake_animation()
+        _rna(bpy.context).scene.frame_end = frame_end
+
+# unit cube: 4 bottom corners (z=0), 4 top corners (z=1), faces wound outwards
+_CUBE_CORNERS = np.array([
+    (-0.5, -0.5, 0), (0.5, -0.5, 0), (0.5, 0.5, 0), (-0.5, 0.5, 0),
+    (-0.5, -0.5, 1), (0.5, -0.5, 1), (0.5, 0.5, 1), (-0.5, 0.5, 1),
+], dtype=np.float32)
+_CUBE_FACES = np.array([
+    (0, 3, 2, 1), (4, 5, 6, 7),
+    (0, 1, 5, 4), (1, 2, 6, 5), (2, 3, 7, 6), (3, 0, 4, 7),
+], dtype=np.int32)
+
+class MeshGridBackend(Backend):
+    # the whole city as a single mesh (8 vertices / 6 faces per cell) with one shared material
+    # that reads the per-face "cell_color" attribute. instead of keyframes every update is stored
+    # and a frame_change handler writes the right one back with foreach_set
+    #
+    # the stored updates only live in this python session: the animation plays (and renders, e.g.
+    # blender -b --python city.py -a) in the session that ran the simulation, also after the file is
+    # saved and opened again there, but a .blend opened in a new blender is just the last state.
+    # use ObjectGridBackend(bake=True) for a file that keeps its animation
+    def setup(self, simulation):
+        self.size = simulation.size
+        self.frames = []
+        self.history = []
+        n_cells = self.size * self.size
+
+        i, j = np.divmod(np.arange(n_cells), self.size)
+        self.centers = np.stack([i, j, np.zeros(n_cells)], axis=1).astype(np.float32)
+        self.coords = np.zeros((n_cells, 8, 3), dtype=np.float32)
+        self.colors = np.zeros((n_cells, 6, 4), dtype=np.float32)
+        self.shown = None
+
+        context, data = _rna(bpy.context), _rna(bpy.data)
+        mesh = data.meshes.new("CityMesh")
+        mesh.vertices.add(n_cells * 8)
+        mesh.loops.add(n_cells * 24)
+        mesh.polygons.add(n_cells * 6)
+
+        vertex_index = (_CUBE_FACES[None, :, :] + 8 * np.arange(n_cells, dtype=np.int32)[:, None, None]).ravel()
+        mesh.loops.foreach_set("vertex_index", vertex_index)
+        mesh.polygons.foreach_set("loop_start", np.arange(0, n_cells * 24, 4, dtype=np.int32))
+        mesh.polygons.foreach_set("loop_total", np.full(n_cells * 6, 4, dtype=np.int32))
+        mesh.update()
+        mesh.attributes.new(name="cell_color", type='FLOAT_COLOR', domain='FACE')
+
+        material = data.materials.new(name="CityMaterial")
+        material.use_nodes = True
+        nodes = material.node_tree.nodes
+        attribute = nodes.new('ShaderNodeAttribute')
+        attribute.attribute_name = "cell_color"
+        bsdf = nodes.get("Principled BSDF")
+        material.node_tree.links.new(attribute.outputs['Color'], bsdf.inputs['Base Color'])
+        mesh.materials.append(material)
+
+        obj = data.objects.new("City", mesh)
+        context.scene.collection.objects.link(obj)
+        self.mesh, self.obj = _raw(mesh), _raw(obj)
+        self.mesh_name = mesh.name # blender adds a suffix if there's a CityMesh already
+
+    def vertex_coords(self, states, cells):
+        # EMPTY cells are collapsed into a point instead of being hidden
+        heights = HEIGHTS[states]
+        footprint = (states != CELLS["EMPTY"]["STATE"]).astype(np.float32)
+        scale = np.stack([footprint, footprint, heights], axis=1)
+        return self.centers[cells, None, :] + _CUBE_CORNERS[None, :, :] * scale[:, None, :]
+
+    def show(self, state_grid, changed=None):
+        # only the changed cells are recomputed, the mesh still gets the whole buffer in one foreach_set
+        states = state_grid.ravel()
+        if changed is None:
+            changed = np.arange(states.size)
+        self.coords[changed] = self.vertex_coords(states[changed], changed)
+        self.colors[changed] = COLOR_TABLE[states[changed]][:, None, :]
+        self.shown = state_grid # (never the simulation's own grid, see update)
+
+        mesh = _rna(self.mesh)
+        with profiling.active().phase("foreach_set"):
+            mesh.vertices.foreach_set("co", self.coords.ravel())
+            mesh.attributes["cell_color"].data.foreach_set("color", self.colors.ravel())
+            mesh.update()
+
+    def update(self, state_grid, frame, changed=None):
+        self.frames.append(frame)
+        # the stored copy is what's shown - the sparse / tiled engines step their state_grid in place
+        self.history.append(state_grid.copy())
+        self.show(self.history[-1], changed if self.shown is not None else None)
+
+    def on_frame_change(self, scene):
+        # looked up by name every time - after the file is reopened self.mesh is gone, the mesh with its name isn't
+        mesh = bpy.data.meshes.get(self.mesh_name)
+        if mesh is None or not self.frames:
+            return
+        self.mesh = mesh
+        step = np.searchsorted(self.frames, scene.frame_current, side="right") - 1
+        state_grid = self.history[max(step, 0)]
+        self.show(state_grid, np.flatnonzero(state_grid.ravel() != self.shown.ravel()))
+
+    def finish(self, frame_end):
+        global _playing
+        _rna(bpy.context).scene.frame_end = frame_end
+        # one handler, whatever ran before - running city.py again replaces the city that's played
+        _playing = self
+        handlers = bpy.app.handlers.frame_change_pre
+        handlers[:] = [handler for handler in handlers if getattr(handler, "__name__", None) != _show_frame.__name__]
+        handlers.append(_show_frame)
+
+_playing = None # the MeshGridBackend the frame handler plays
+
+@persistent # stays when a file is loaded, so saving and reopening in the same session keeps the animation
+def _show_frame(scene, *args):
+    if _playing is not None:
+        _playing.on_frame_change(scene)
+
+BACKENDS = {
+    "objects": ObjectGridBackend,
+    "baked": lambda: ObjectGridBackend(bake=True),
+    "mesh": MeshGridBackend,
+}
@@ -0,0 +1,72 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from automaton import CELLS, N_STATES, CitySimulation, make_rules
+
+# monte-carlo ensembles - many independent seeded runs of the same configuration
+# python ensemble.py --size 100 --steps 200 --runs 500 --workers 8 --seed 0 --out ensemble.npz
+#
+# every run gets its own np.random.Generator spawned from one SeedSequence, so the whole ensemble
+# is reproducible from --seed no matter how many workers there are or which worker gets which run.
+# workers only send back the number of cells in each state after every step, never the grids
+
+def run_one(job):
+    size, steps, seed_sequence, rules_path = job
+    simulation = CitySimulation(size, rng=np.random.default_rng(seed_sequence), rules=make_rules(rules_path))
+    counts = np.empty((steps + 1, N_STATES), dtype=np.int64)
+    counts[0] = np.bincount(simulation.state_grid.ravel(), minlength=N_STATES)
+    for step in range(steps):
+        simulation.step()
+        counts[step + 1] = np.bincount(simulation.state_grid.ravel(), minlength=N_STATES)
+    return counts
+
+def run_chunk(first, jobs):
+    # a few runs per task, so short runs aren't all pickling overhead
+    return [(first + k, run_one(job)) for k, job in enumerate(jobs)]
+
+def run_ensemble(size, steps, runs, seed=None, workers=None, chunksize=None, rules_path=None):
+    # yields (run index, per-step state counts) as soon as each chunk of runs is done - in whatever order
+    # they finish, a slow run doesn't hold back the ones after it
+    seed_sequences = np.random.SeedSequence(seed).spawn(runs)
+    jobs = [(size, steps, seed_sequence, rules_path) for seed_sequence in seed_sequences] # compiled in the workers
+    workers = workers or os.cpu_count()
+    chunksize = chunksize or max(1, runs // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_chunk, first, jobs[first:first + chunksize]) for first in range(0, runs, chunksize)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def main():
+    parser = argparse.ArgumentParser(description="run many seeded city simulations in parallel")
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument("--out", metavar="PATH", help="save the (runs, steps + 1, states) counts as .npz")
+    parser.add_argument("--rules", metavar="PATH", help="rule table to use instead of rules.json")
+    args = parser.parse_args()
+
+    counts = np.empty((args.runs, args.steps + 1, N_STATES), dtype=np.int64)
+    start = time.perf_counter()
+    for run, run_counts in run_ensemble(args.size, args.steps, args.runs, args.seed, args.workers, rules_path=args.rules):
+        counts[run] = run_counts
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.runs} runs x {args.steps} steps on {args.size}x{args.size} in {elapsed:.2f}s "
+          f"({args.runs / elapsed:.2f} runs/s, {args.runs * args.steps / elapsed:.1f} steps/s)")
+
+    final = counts[:, -1] / args.size**2
+    for name in ("SKYSCRAPER", "PARK", "HOUSE", "ROAD"):
+        share = final[:, CELLS[name]["STATE"]]
+        print(f"{name:>12}: {100 * share.mean():.3f}% +- {100 * share.std():.3f}% of the grid at the end")
+
+    if args.out:
+        np.savez_compressed(args.out, counts=counts, size=args.size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import json
+import numpy as np
+
+import profiling
+from automaton import STATE_DTYPE
+from backends import Backend
+
+# every step of a run in one preallocated file, read back through np.memmap
+#
+# layout:
+#   [0:8]     magic
+#   [8:16]    number of recorded steps (uint64, updated on every record)
+#   [16:20]   header json length (uint32)
+#   [20:...]  header json - grid size, capacity, seed, rule parameters
+#   [4096:]   the states, (steps + 1, size, size) uint8 - the initial one, then the one after every step
+
+MAGIC = b"CITYHIST"
+HEADER_SIZE = 4096
+
+class HistoryRecorder(Backend):
+    # a backend, so it can be run() on its own or next to a renderer (see backends.TeeBackend).
+    # run() only hands the states before every step to the backend, the one after the last step is taken from
+    # the simulation in finish - so a run of `steps` steps leaves steps + 1 states
+    def __init__(self, path, steps, params=None):
+        self.path = path
+        self.capacity = steps + 1
+        self.params = params or {}
+
+    def setup(self, simulation):
+        self.simulation = simulation
+        self.size = simulation.size
+        header = json.dumps({
+            "size": self.size,
+            "capacity": self.capacity,
+            "seed": simulation.seed,
+            "dtype": np.dtype(STATE_DTYPE).str,
+            "params": self.params,
+        }).encode()
+        if 20 + len(header) > HEADER_SIZE:
+            raise ValueError(f"history header is too big ({len(header)} bytes)")
+
+        with open(self.path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint64(0).tobytes())
+            f.write(np.uint32(len(header)).tobytes())
+            f.write(header)
+            f.truncate(HEADER_SIZE + self.capacity * self.size * self.size * np.dtype(STATE_DTYPE).itemsize)
+
+        self.count = np.memmap(self.path, dtype="<u8", mode="r+", offset=len(MAGIC), shape=(1,))
+        self.states = np.memmap(self.path, dtype=STATE_DTYPE, mode="r+", offset=HEADER_SIZE,
+                                shape=(self.capacity, self.size, self.size))
+
+    def update(self, state_grid, frame, changed=None):
+        step = int(self.count[0])
+        if step >= self.capacity:
+            raise IndexError(f"history is full ({self.capacity} steps)")
+        self.states[step] = state_grid
+        self.count[0] = step + 1
+
+    def finish(self, frame_end):
+        # (replaying a history into a recorder - there's no simulation, the last update already was the last state)
+        final_state = getattr(self.simulation, "state_grid", None)
+        if final_state is not None and int(self.count[0]) < self.capacity:
+            self.update(final_state, frame_end)
+        self.states.flush()
+        self.count.flush()
+
+class HistoryReader:
+    # any step is just a view into the mapped file, nothing is read until it's used
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a city history file")
+            recorded = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+            header_length = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+            self.header = json.loads(f.read(header_length))
+
+        self.size = self.header["size"]
+        self.seed = self.header["seed"]
+        self.params = self.header["params"]
+        self.states = np.memmap(path, dtype=np.dtype(self.header["dtype"]), mode="r", offset=HEADER_SIZE,
+                                shape=(self.header["capacity"], self.size, self.size))[:recorded]
+
+    def __len__(self):
+        return len(self.states)
+
+    def __getitem__(self, step):
+        return self.states[step]
+
+    def changed(self, step):
+        # flat indices that differ from the previous step (None for the first one, like in run())
+        if step == 0:
+            return None
+        return np.flatnonzero(self.states[step].ravel() != self.states[step - 1].ravel())
+
+    def replay(self, backend, frame_start=1, frame_duration=12, start=0, stop=None):
+        # feeds the recorded steps to a renderer exactly like backends.run does, without simulating.
+        # stop=None goes up to the state after the last step as well (one more frame than the run that recorded it),
+        # stop=steps shows the same frames as that run
+        stop = len(self) if stop is None else min(stop, len(self))
+        profiler = profiling.active()
+        with profiler.phase("setup"):
+            backend.setup(self)
+        for step in range(start, stop):
+            frame = frame_start + (step - start) * frame_duration
+            changed = None if step == start else self.changed(step)
+            with profiler.phase("update"):
+                backend.update(np.asarray(self.states[step]), frame, changed)
+            profiler.record_step(step, changed)
+        frame_end = frame_start + (stop - start) * frame_duration - 1
+        with profiler.phase("finish"):
+            backend.finish(frame_end)
+        return frame_end
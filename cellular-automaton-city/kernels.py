@@ -0,0 +1,158 @@
+import argparse
+import time
+import warnings
+import numpy as np
+
+from automaton import (DEFAULT_RULES, CitySimulation, CounterRNG, RoadAgents, RULE_STREAM, ROAD_STREAM,
+                       ROAD_CUM_WEIGHTS, ROAD_MOVES, ROAD, ACTIVE_ROAD)
+
+# the whole step (rules + road walk with the skip semantics) as one JIT-compiled loop over the grid,
+# the same loop as automaton.step_loop, with the rules read from the compiled tables (rules.py). randomness is the CounterRNG hash computed inline, so the
+# only RNG state is (seed, step) - and the result is bit-identical to the numpy engine with a CounterRNG.
+# numba is optional: without it KernelCitySimulation falls back to the numpy engine (same results)
+#
+# python kernels.py --size 1000 --steps 50
+# python kernels.py --size 200 --steps 200 --verify
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def _mix(x):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+    @njit(cache=True)
+    def _uniform(keys, cell):
+        # CounterRNG.uniform for a single cell
+        x = np.uint64(cell) * np.uint64(0x9E3779B97F4A7C15) + keys[0]
+        x = _mix(_mix(x ^ keys[1]) ^ keys[2])
+        return (x >> np.uint64(11)) * (1.0 / 2**53)
+
+    @njit(cache=True)
+    def step_kernel(state_grid, rule_keys, road_keys, applies, counted, table, probability, next_state, cum_weights, moves):
+        size_x, size_y = state_grid.shape
+        n_rules, n_states = applies.shape
+        new_grid = state_grid.copy()
+        skip = np.zeros(state_grid.shape, dtype=np.bool_) # prevents overwriting new ACTIVE_ROAD in the same step
+        counts = np.zeros(n_states + 1, dtype=np.int64) # + the 'outside' state of the border
+
+        # with a border of 'outside' cells every cell has a full 3x3 neighbourhood, no clipping needed
+        padded = np.full((size_x + 2, size_y + 2), n_states, dtype=state_grid.dtype)
+        padded[1:-1, 1:-1] = state_grid
+
+        # the tables as short lists: the rules of every state (in order) and the states every rule counts
+        state_rules = np.zeros((n_states, n_rules), dtype=np.int64)
+        n_state_rules = np.zeros(n_states, dtype=np.int64)
+        counted_states = np.zeros((n_rules, n_states), dtype=np.int64)
+        n_counted = np.zeros(n_rules, dtype=np.int64)
+        for r in range(n_rules):
+            for s in range(n_states):
+                if applies[r, s]:
+                    state_rules[s, n_state_rules[s]] = r
+                    n_state_rules[s] += 1
+                if counted[r, s]:
+                    counted_states[r, n_counted[r]] = s
+                    n_counted[r] += 1
+
+        for i in range(size_x):
+            for j in range(size_y):
+                if skip[i, j]:
+                    continue
+
+                current_state = state_grid[i, j]
+                if current_state == ACTIVE_ROAD:
+                    u = _uniform(road_keys, i * size_y + j) * cum_weights[-1]
+                    k = 0
+                    while k < len(cum_weights) - 1 and cum_weights[k] <= u:
+                        k += 1
+                    x, y = i + moves[k, 0], j + moves[k, 1]
+                    if 0 <= x < size_x and 0 <= y < size_y:
+                        new_grid[i, j] = ROAD
+                        new_grid[x, y] = ACTIVE_ROAD
+                        skip[x, y] = True
+                    continue
+
+                if n_state_rules[current_state] == 0:
+                    continue # e.g. finished roads
+
+                counts[:] = 0
+                for x in range(i, i + 3):
+                    for y in range(j, j + 3):
+                        counts[padded[x, y]] += 1
+                counts[current_state] -= 1 # the cell itself isn't its own neighbor
+
+                # first matching rule wins
+                for k in range(n_state_rules[current_state]):
+                    r = state_rules[current_state, k]
+                    total = 0
+                    for c in range(n_counted[r]):
+                        total += counts[counted_states[r, c]]
+                    if not table[r, total]:
+                        continue
+                    if probability[r] >= 1 or _uniform(rule_keys, i * size_y + j) < probability[r]:
+                        new_grid[i, j] = next_state[r]
+                    break
+
+        return new_grid
+
+class KernelCitySimulation(CitySimulation):
+    def __init__(self, size, seed=None, rules=DEFAULT_RULES):
+        super().__init__(size, seed=seed, rng=CounterRNG(seed), rules=rules)
+        if not HAVE_NUMBA:
+            warnings.warn("numba is not installed, using the numpy engine instead (same results, just slower)")
+
+    def step(self):
+        if not HAVE_NUMBA:
+            return super().step()
+
+        rng = self.step_rng()
+        rules = self.rules
+        new_grid = step_kernel(self.state_grid, rng.keys(RULE_STREAM), rng.keys(ROAD_STREAM),
+                               rules.applies, rules.counted, rules.table, rules.probability, rules.next,
+                               ROAD_CUM_WEIGHTS, ROAD_MOVES)
+        changed = np.flatnonzero(new_grid != self.state_grid)
+        self.state_grid = new_grid
+        self.roads = RoadAgents.from_grid(new_grid) # the kernel finds the heads by itself
+        self.step_count += 1
+        self.changed_per_step.append(len(changed))
+        return changed
+
+def verify(size, steps, seed, rules=DEFAULT_RULES):
+    # the compiled kernel and the numpy engine (both on the same CounterRNG) have to agree on every step
+    numpy_engine = CitySimulation(size, seed=seed, rng=CounterRNG(seed), rules=rules)
+    kernel_engine = KernelCitySimulation(size, seed=seed, rules=rules)
+    for _ in range(steps):
+        changed_numpy, changed_kernel = numpy_engine.step(), kernel_engine.step()
+        if not (np.array_equal(numpy_engine.state_grid, kernel_engine.state_grid) and np.array_equal(changed_numpy, changed_kernel)):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="run the city automaton on the compiled kernel")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="compare against the numpy engine instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.size, args.steps, args.seed)
+        print("compiled kernel matches the numpy engine" if ok else "MISMATCH between compiled kernel and numpy engine")
+        raise SystemExit(0 if ok else 1)
+
+    simulation = KernelCitySimulation(args.size, seed=args.seed)
+    simulation.step() # compile
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        simulation.step()
+    elapsed = time.perf_counter() - start
+    print(f"{args.steps} steps on a {args.size}x{args.size} grid in {elapsed:.3f}s ({args.steps / elapsed:.2f} steps/s, numba: {HAVE_NUMBA})")
+
+if __name__ == "__main__":
+    main()
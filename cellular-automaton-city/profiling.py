@@ -0,0 +1,132 @@
+import contextlib
+import cProfile
+import csv
+import json
+import os
+import time
+
+# where the time of a run goes - per-phase wall time (simulation step, backend update, frame_set,
+# keyframing, ...), how many calls into blender's RNA were made and how many cells changed per step.
+# switched off by default (all the hooks are no-ops then), switched on for a run with session():
+#
+# python simulate.py --size 300 --steps 100 --profile report.json --cprofile run.prof
+# CITY_PROFILE=report.csv CITY_CPROFILE=run.prof blender -b --python city.py
+#
+# the report is JSON (phases, counters and every step) or CSV (one row per step) depending on the extension,
+# the cProfile dump can be read with python -m pstats run.prof or snakeviz
+
+REPORT_ENV = "CITY_PROFILE"
+CPROFILE_ENV = "CITY_CPROFILE"
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.phases = {} # name -> [calls, seconds]
+        self.last = {} # name -> seconds of its last call
+        self.counters = {} # name -> count, "rna." ones are calls into blender
+        self.steps = []
+        self.rna_at_last_step = 0
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            totals = self.phases.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+            self.last[name] = elapsed
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def rna_calls(self):
+        return sum(n for name, n in self.counters.items() if name.startswith("rna."))
+
+    def record_step(self, step, changed):
+        # changed - the cells changed by this step (None when not known)
+        rna_calls = self.rna_calls()
+        self.steps.append({
+            "step": step,
+            "changed": None if changed is None else len(changed),
+            "step_s": self.last.pop("step", None),
+            "update_s": self.last.pop("update", None),
+            "rna_calls": rna_calls - self.rna_at_last_step,
+        })
+        self.rna_at_last_step = rna_calls
+
+    def report(self):
+        return {
+            "total_s": time.perf_counter() - self.start,
+            "phases": {name: {"calls": calls, "total_s": seconds, "mean_s": seconds / calls}
+                       for name, (calls, seconds) in self.phases.items()},
+            "counters": self.counters,
+            "rna_calls": self.rna_calls(),
+            "steps": self.steps,
+        }
+
+    def write(self, path):
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["step", "changed", "step_s", "update_s", "rna_calls"])
+                writer.writeheader()
+                writer.writerows(self.steps)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.report(), f, indent=1)
+
+    def summary(self):
+        report = self.report()
+        lines = [f"{'phase':>16} {'calls':>8} {'total s':>10} {'mean ms':>10} {'share':>7}"]
+        for name, phase in sorted(report["phases"].items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"{name:>16} {phase['calls']:>8} {phase['total_s']:>10.3f} {1000 * phase['mean_s']:>10.3f} "
+                         f"{100 * phase['total_s'] / report['total_s']:>6.1f}%")
+        lines.append(f"{'rna calls':>16} {report['rna_calls']:>8}")
+        return "\n".join(lines)
+
+class NullProfiler:
+    # what the hooks talk to when profiling is off
+    enabled = False
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, n=1):
+        pass
+
+    def record_step(self, step, changed):
+        pass
+
+_active = NullProfiler()
+
+def active():
+    return _active
+
+@contextlib.contextmanager
+def session(report=None, cprofile=None):
+    # report / cprofile - output paths, each falls back to its environment variable, nothing at all -> profiling stays off
+    global _active
+    report = report or os.environ.get(REPORT_ENV)
+    cprofile = cprofile or os.environ.get(CPROFILE_ENV)
+    if not report and not cprofile:
+        yield None
+        return
+
+    profiler = _active = Profiler()
+    python_profiler = cProfile.Profile() if cprofile else None
+    if python_profiler:
+        python_profiler.enable()
+    try:
+        yield profiler
+    finally:
+        if python_profiler:
+            python_profiler.disable()
+            python_profiler.dump_stats(cprofile)
+        _active = NullProfiler()
+        if report:
+            profiler.write(report)
+        print(profiler.summary())
@@ -0,0 +1,129 @@
+import functools
+import json
+import operator
+import numpy as np
+
+# declarative cell transitions (see rules.json):
+#   state       - the states the rule applies to
+#   count       - neighbor states to count (summed), leave it out for a rule that always matches
+#   op, value   - the predicate on that count
+#   probability - chance that a matching cell really changes (default 1)
+#   next        - the new state
+# rules are checked in order and only the first matching one is used, exactly like the old elif chain.
+# ACTIVE_ROAD can be counted but not be a rule's state or next - the road walk (automaton.RoadAgents) owns it,
+# a head a rule made or removed would be lost to it
+#
+# compile_rules turns them into lookup tables once - which rules apply to a state, which neighbor
+# states each rule counts and, for every possible count 0..8, whether the predicate holds - so a
+# step is a handful of table lookups over the whole grid and no branching per cell
+
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq, "!=": operator.ne}
+MAX_NEIGHBORS = 8
+ROAD_HEAD = "ACTIVE_ROAD"
+
+def load_rules(path):
+    with open(path) as f:
+        return json.load(f)["rules"]
+
+class CompiledRules:
+    def __init__(self, spec, state_ids):
+        # state_ids - state name -> state number (from CELLS)
+        self.spec = spec
+        n_states = len(state_ids)
+        n_rules = len(spec)
+        if n_rules > 255:
+            raise ValueError("at most 255 rules") # rule indices are kept as uint8
+
+        self.applies = np.zeros((n_rules, n_states), dtype=bool) # applies[r, state]
+        self.counted = np.zeros((n_rules, n_states), dtype=bool) # counted[r, neighbor state]
+        self.table = np.zeros((n_rules, MAX_NEIGHBORS + 1), dtype=bool) # table[r, count] - the predicate
+        self.probability = np.ones(n_rules)
+        self.next = np.zeros(n_rules, dtype=np.uint8)
+
+        def state_id(name):
+            if name not in state_ids:
+                raise ValueError(f"unknown cell state {name!r} in rules")
+            return state_ids[name]
+
+        for r, rule in enumerate(spec):
+            if ROAD_HEAD in rule["state"] or rule["next"] == ROAD_HEAD:
+                raise ValueError(f"rule {r}: {ROAD_HEAD} is moved by the road walk, it can't be a rule's state or next")
+            self.applies[r, [state_id(name) for name in rule["state"]]] = True
+            self.next[r] = state_id(rule["next"])
+            self.probability[r] = rule.get("probability", 1)
+
+            if "count" in rule:
+                if rule["op"] not in OPS:
+                    raise ValueError(f"unknown operator {rule['op']!r} in rules")
+                self.counted[r, [state_id(name) for name in rule["count"]]] = True
+                self.table[r] = OPS[rule["op"]](np.arange(MAX_NEIGHBORS + 1), rule["value"])
+            else:
+                self.table[r] = True
+
+        # the numpy side of the tables: a state set / count run is cheaper to test with a couple of
+        # comparisons than with a gather, so that's what each rule gets when its table allows it
+        self.tests = [(self.state_test(r), self.count_test(r)) for r in range(n_rules)]
+        self.random = self.probability < 1
+
+    # (python ints in the comparisons below - a numpy int64 scalar would upcast the whole uint8 grid)
+    def state_test(self, r):
+        states = np.flatnonzero(self.applies[r]).tolist()
+        if len(states) <= 3:
+            return lambda state: functools.reduce(np.logical_or, [state == s for s in states])
+        return lambda state: np.take(self.applies[r], state)
+
+    def count_test(self, r):
+        counted = np.flatnonzero(self.counted[r]).tolist()
+        hits = np.flatnonzero(self.table[r]).tolist()
+        if len(hits) == len(self.table[r]):
+            return None # always true
+        if len(hits) == 0:
+            return lambda counts: np.zeros(counts.shape[1:], dtype=bool)
+
+        def total(counts):
+            if len(counted) == 1:
+                return counts[counted[0]]
+            return np.add.reduce(counts[counted], dtype=np.uint8)
+
+        lo, hi = hits[0], hits[-1]
+        if len(hits) == hi - lo + 1: # one run of counts, e.g. '> 2' or '< 8'
+            if lo == 0:
+                return lambda counts: total(counts) <= hi
+            if hi == MAX_NEIGHBORS:
+                return lambda counts: total(counts) >= lo
+            return lambda counts: np.isin(total(counts), hits)
+        return lambda counts: np.take(self.table[r], total(counts))
+
+    def evaluate(self, state, counts, draw):
+        # state - any shape, counts - (n_states, *state.shape), draw(positions) - uniforms for the cells at
+        # these (sorted) flat positions of state
+        # returns the new states and the cells that matched a random rule but didn't change (still 'waiting')
+        n_rules = len(self.next)
+
+        # first[cell] = index of the first matching rule, n_rules if none
+        # (the minimum over rules of r where the rule matches, n_rules elsewhere)
+        first = np.full(state.shape, n_rules, dtype=np.uint8)
+        for r, (state_test, count_test) in enumerate(self.tests):
+            matched = state_test(state)
+            if count_test is not None and matched.any():
+                matched &= count_test(counts)
+            np.minimum(first, n_rules - matched.view(np.uint8) * np.uint8(n_rules - r), out=first)
+
+        # only the (few) cells with a matching rule are touched from here on, by flat position
+        positions = np.flatnonzero(first < n_rules)
+        rule = first.reshape(-1)[positions]
+        waiting = np.zeros(state.shape, dtype=bool)
+        rolling = self.random[rule]
+        if rolling.any():
+            lost = draw(positions[rolling]) >= self.probability[rule[rolling]]
+            waiting.reshape(-1)[positions[rolling][lost]] = True
+            keep = ~rolling
+            keep[rolling] = ~lost
+            positions, rule = positions[keep], rule[keep]
+
+        new_state = state.copy()
+        new_state.reshape(-1)[positions] = self.next[rule]
+        return new_state, waiting
+
+def compile_rules(spec, state_ids):
+    return CompiledRules(spec, state_ids)
@@ -0,0 +1,58 @@
+import argparse
+import time
+import numpy as np
+
+import profiling
+from automaton import CELLS, N_STATES, CitySimulation, make_rules, rule_params
+from backends import NullBackend, run
+from history import HistoryRecorder
+from kernels import KernelCitySimulation
+from sparse import SparseCitySimulation
+from tiled import TiledCitySimulation
+
+ENGINES = {
+    "numpy": CitySimulation, # whole grid at once
+    "sparse": SparseCitySimulation, # only cells near recent changes
+    "tiled": TiledCitySimulation, # tile by tile, for grids that don't fit in memory
+    "compiled": KernelCitySimulation, # numba kernel, falls back to numpy without numba
+}
+
+# headless run, no blender needed:
+# python simulate.py --size 1000 --steps 100 --seed 42
+# python simulate.py --size 1000 --steps 100 --seed 42 --engine compiled
+# python simulate.py --size 1000 --steps 10000 --seed 42 --record city.hist (replay it with REPLAY_FILE in city.py)
+# python simulate.py --size 300 --steps 100 --seed 42 --rules my_rules.json (same format as rules.json)
+# python simulate.py --size 1000 --steps 100 --profile report.json --cprofile run.prof
+
+def main():
+    parser = argparse.ArgumentParser(description="run the city automaton without rendering")
+    parser.add_argument("--size", type=int, default=30)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engine", choices=list(ENGINES), default="numpy")
+    parser.add_argument("--record", metavar="PATH", help="store every step in a history file")
+    parser.add_argument("--rules", metavar="PATH", help="rule table to use instead of rules.json")
+    parser.add_argument("--profile", metavar="PATH", help="per-phase timing report (.json or .csv)")
+    parser.add_argument("--cprofile", metavar="PATH", help="cProfile stats of the whole run")
+    args = parser.parse_args()
+
+    rules = make_rules(args.rules)
+    simulation = ENGINES[args.engine](args.size, seed=args.seed, rules=rules)
+
+    start = time.perf_counter()
+    backend = HistoryRecorder(args.record, args.steps, rule_params(rules)) if args.record else NullBackend()
+    with profiling.session(args.profile, args.cprofile):
+        run(simulation, backend, args.steps)
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.steps} steps on a {args.size}x{args.size} grid in {elapsed:.3f}s ({args.steps / elapsed:.2f} steps/s)")
+    changed = np.array(simulation.changed_per_step)
+    if len(changed): # nothing to summarize with --steps 0
+        print(f"cells changed per step: mean {changed.mean():.1f}, max {changed.max()}, last {changed[-1]} "
+              f"({100 * changed.mean() / args.size**2:.2f}% of the grid on average)")
+    counts = np.bincount(simulation.state_grid.ravel(), minlength=N_STATES)
+    for name, cell in CELLS.items():
+        print(f"{name:>12}: {counts[cell['STATE']]}")
+
+if __name__ == "__main__":
+    main()
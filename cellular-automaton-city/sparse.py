@@ -0,0 +1,126 @@
+import argparse
+import time
+import numpy as np
+
+from automaton import N_STATES, STATE_DTYPE, DEFAULT_RULES, CitySimulation, CounterRNG, RoadAgents, ROAD_MOVES, apply_rules, initial_grid
+
+# in a grown city most cells never change again - a cell can only change if something in its
+# 3x3 neighbourhood changed in the last step, or if it's waiting on a random rule (one with
+# probability < 1 in rules.json, e.g. EMPTY/PARK next to a road that lost the 50% coin flip). only those cells (the frontier) are evaluated, so
+# a step costs O(activity) instead of O(grid area).
+#
+# the grid is stored with a one cell border of an 'outside' state, so neighbours are just fixed
+# offsets from a flat index and the border cells never need special casing.
+# with a CounterRNG the result is bit-identical to the full scan, with a Generator it's the same
+# process, just drawn in a different order
+#
+# python sparse.py --size 1000 --steps 300 --seed 1
+# python sparse.py --size 200 --steps 200 --verify
+
+class SparseCitySimulation(CitySimulation):
+    def __init__(self, size, seed=None, rng=None, rules=DEFAULT_RULES):
+        self.size = size
+        self.seed = seed
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+        self.rules = rules
+
+        width = size + 2
+        self.padded = np.full((size + 2, size + 2), N_STATES, dtype=STATE_DTYPE)
+        self.padded[1:-1, 1:-1] = initial_grid(size, self.rng)
+        self.neighbors = np.array([dx * width + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)])
+        self.neighborhood = np.append(self.neighbors, 0)
+
+        self.roads = RoadAgents.from_grid(self.state_grid)
+        self.active = self.to_padded(np.arange(size * size)) # everything is evaluated in the first step
+        self.step_count = 0
+        self.changed_per_step = []
+        self.active_per_step = []
+
+    @property
+    def state_grid(self):
+        return self.padded[1:-1, 1:-1]
+
+    def to_padded(self, cells):
+        rows, cols = np.divmod(cells, self.size)
+        return (rows + 1) * (self.size + 2) + cols + 1
+
+    def to_grid(self, cells):
+        rows, cols = np.divmod(cells, self.size + 2)
+        return (rows - 1) * self.size + cols - 1
+
+    def step(self):
+        rng = self.step_rng()
+        flat = self.padded.ravel()
+        active = self.active
+        cells = self.to_grid(active)
+
+        # everything is read before anything is written, so the update can be done in place
+        state = flat[active]
+        neighbor_states = flat[active[:, None] + self.neighbors]
+        counts = np.stack([(neighbor_states == s).sum(axis=1, dtype=np.uint8) for s in range(N_STATES)])
+        new_state, waiting = apply_rules(state, counts, rng, cells=cells, rules=self.rules, return_waiting=True)
+
+        # the cells a road head can touch this step (its own + the three it may move to)
+        heads = self.roads.heads
+        road_cells = np.unique((heads[:, None] + np.append(ROAD_MOVES @ [self.size, 1], 0)).ravel())
+        road_cells = road_cells[(road_cells >= 0) & (road_cells < self.size * self.size)]
+        road_before = flat[self.to_padded(road_cells)]
+
+        rule_changed = new_state != state
+        flat[active[rule_changed]] = new_state[rule_changed]
+        self.roads.advance(self.state_grid, rng)
+
+        road_changed = road_cells[flat[self.to_padded(road_cells)] != road_before]
+        changed = cells[rule_changed]
+        # road_changed has the final word on every cell a head could touch (also one a rule changed and a head changed back)
+        changed = np.sort(np.concatenate([changed[~np.isin(changed, road_cells)], road_changed]))
+
+        # next frontier: around every change + the cells still waiting on a coin flip
+        around = (self.to_padded(changed)[:, None] + self.neighborhood).ravel()
+        frontier = np.unique(np.concatenate([around, active[waiting]]))
+        self.active = frontier[flat[frontier] != N_STATES]
+
+        self.step_count += 1
+        self.changed_per_step.append(len(changed))
+        self.active_per_step.append(len(active))
+        return changed
+
+def verify(size, steps, seed, rules=DEFAULT_RULES):
+    # with a CounterRNG the sparse run has to match the full scan exactly
+    full = CitySimulation(size, seed=seed, rng=CounterRNG(seed), rules=rules)
+    sparse = SparseCitySimulation(size, seed=seed, rng=CounterRNG(seed), rules=rules)
+    for _ in range(steps):
+        changed_full, changed_sparse = full.step(), sparse.step()
+        if not (np.array_equal(full.state_grid, sparse.state_grid) and np.array_equal(changed_full, changed_sparse)):
+            return False
+    if sparse.changed_per_step != full.changed_per_step:
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="step the city only where something can still change")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="compare against the full scan instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.size, args.steps, args.seed)
+        print("sparse step is bit-identical to the full scan" if ok else "MISMATCH between sparse step and full scan")
+        raise SystemExit(0 if ok else 1)
+
+    for simulation_class in (CitySimulation, SparseCitySimulation):
+        simulation = simulation_class(args.size, seed=args.seed)
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            simulation.step()
+        elapsed = time.perf_counter() - start
+        print(f"{simulation_class.__name__:>20}: {args.steps / elapsed:8.2f} steps/s")
+
+    active = np.array(simulation.active_per_step)
+    print(f"evaluated cells per step: first {active[0]}, last {active[-1]} "
+          f"({100 * active[-1] / args.size**2:.3f}% of the grid)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import pytest
+
+from automaton import STATE_IDS
+from kernels import HAVE_NUMBA, verify
+from rules import compile_rules
+
+# kernels.py --verify as a test: compiled kernel vs numpy engine, bit for bit on every step
+# (without numba the kernel engine is the numpy engine, nothing to compare)
+pytestmark = pytest.mark.skipif(not HAVE_NUMBA, reason="numba is not installed")
+
+@pytest.mark.parametrize("size, seed", [(60, 0), (97, 7)])
+def test_kernel_matches_numpy(size, seed):
+    assert verify(size, steps=80, seed=seed)
+
+def test_kernel_matches_numpy_other_rules():
+    # the kernel reads the compiled tables, so any rule table has to give the same run
+    # (ACTIVE_ROAD can't be a rule's state or next, see rules.py)
+    spec = [
+        {"state": ["EMPTY"], "count": ["ROAD", "ACTIVE_ROAD"], "op": ">", "value": 0, "probability": 0.3, "next": "PARK"},
+        {"state": ["PARK"], "count": ["PARK"], "op": ">=", "value": 3, "probability": 0.5, "next": "HOUSE"},
+        {"state": ["HOUSE"], "count": ["EMPTY"], "op": "<", "value": 2, "next": "MEDIUM"},
+        {"state": ["MEDIUM", "HOUSE"], "count": ["PARK"], "op": "==", "value": 0, "probability": 0.1, "next": "EMPTY"},
+        {"state": ["ROAD"], "count": ["EMPTY"], "op": ">", "value": 5, "probability": 0.2, "next": "PARK"},
+    ]
+    assert verify(70, steps=80, seed=2, rules=compile_rules(spec, STATE_IDS))
@@ -0,0 +1,17 @@
+import pytest
+
+from automaton import STATE_IDS
+from rules import compile_rules
+
+# ACTIVE_ROAD belongs to the road walk - a rule that makes or removes heads is refused
+
+@pytest.mark.parametrize("rule", [
+    {"state": ["ACTIVE_ROAD"], "next": "ROAD"},
+    {"state": ["POND"], "count": ["PARK"], "op": ">", "value": 3, "next": "ACTIVE_ROAD"},
+])
+def test_rules_cant_make_or_remove_road_heads(rule):
+    with pytest.raises(ValueError, match="ACTIVE_ROAD"):
+        compile_rules([rule], STATE_IDS)
+
+def test_rules_can_count_road_heads():
+    compile_rules([{"state": ["EMPTY"], "count": ["ACTIVE_ROAD"], "op": ">", "value": 0, "next": "HOUSE"}], STATE_IDS)
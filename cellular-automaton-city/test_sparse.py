@@ -0,0 +1,19 @@
+import pytest
+
+from automaton import STATE_IDS, RULES_FILE
+from rules import compile_rules, load_rules
+from sparse import verify
+
+# sparse.py --verify as a test: sparse vs full scan, bit for bit (grid and changed cells) on every step
+
+@pytest.mark.parametrize("size, seed", [(60, 0), (101, 5)])
+def test_sparse_matches_full_scan(size, seed):
+    assert verify(size, steps=80, seed=seed)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_sparse_rules_on_road_cells(seed):
+    # rules.json never changes a road, this table does - and the road heads then write over cells
+    # the rules have already changed
+    spec = [{"state": ["ROAD"], "count": ["EMPTY"], "op": "<", "value": 9, "probability": 0.5, "next": "PARK"}]
+    rules = compile_rules(spec + load_rules(RULES_FILE), STATE_IDS)
+    assert verify(30, steps=150, seed=seed, rules=rules)
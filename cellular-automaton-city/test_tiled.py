@@ -0,0 +1,24 @@
+import pytest
+
+from automaton import STATE_IDS, RULES_FILE
+from rules import compile_rules, load_rules
+from tiled import verify
+
+# tiled.py --verify as a test: tiled vs whole-grid engine, bit for bit on every step
+# (tile sizes that don't divide the grid, tiles smaller than a road head's reach, threads)
+
+@pytest.mark.parametrize("size, tile_size, workers", [
+    (120, 32, 1),
+    (101, 7, 1),
+    (90, 90, 1),
+    (130, 40, 4),
+])
+def test_tiled_matches_whole_grid(size, tile_size, workers):
+    assert verify(size, steps=60, seed=3, tile_size=tile_size, workers=workers)
+
+def test_tiled_rules_on_road_cells():
+    # rules.json never changes a road, this table does - and the road heads then write over cells
+    # the tiles have already changed
+    spec = [{"state": ["ROAD"], "count": ["EMPTY"], "op": "<", "value": 9, "probability": 0.5, "next": "PARK"}]
+    rules = compile_rules(spec + load_rules(RULES_FILE), STATE_IDS)
+    assert verify(30, steps=150, seed=1, tile_size=7, rules=rules)
@@ -0,0 +1,163 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from automaton import STATE_DTYPE, DEFAULT_RULES, ROAD_MOVES, CitySimulation, CounterRNG, RoadAgents, ACTIVE_ROAD, apply_rules, initial_cells, initial_roads, neighbor_counts
+
+# grids too big to step in one go (e.g. 50k x 50k) - the state lives in a memory-mapped file and
+# is stepped one tile at a time. each tile is read with a one cell halo, so its neighbor counts
+# are exactly the whole-grid ones, and only the tile itself is written back.
+# road heads stay global (RoadAgents works on flat indices of the full grid) and are moved after
+# all the tiles, so a head crossing a tile border is simply written into the neighbouring tile.
+# randomness comes from a CounterRNG, which makes the result bit-identical to the whole-grid step
+#
+# track_changes=False - step() only counts the changed cells (changed_per_step) and returns None, a list of
+# the changed cells can be bigger than the grid itself (8 bytes per cell, a busy step on 50k x 50k is gigabytes)
+#
+# python tiled.py --size 20000 --tile-size 2048 --steps 10 --path city.state --workers 4
+# python tiled.py --size 300 --tile-size 64 --steps 50 --verify
+
+def tiles(size, tile_size):
+    for r0 in range(0, size, tile_size):
+        for c0 in range(0, size, tile_size):
+            yield r0, min(r0 + tile_size, size), c0, min(c0 + tile_size, size)
+
+class TiledCitySimulation(CitySimulation):
+    def __init__(self, size, seed=None, tile_size=1024, path=None, workers=1, rules=DEFAULT_RULES, track_changes=True):
+        # path - file for the two state buffers (current and next), None keeps them in memory
+        self.size = size
+        self.seed = seed
+        self.rng = CounterRNG(seed)
+        self.rules = rules
+        self.tile_size = tile_size
+        self.workers = workers
+        self.track_changes = track_changes
+
+        if path is None:
+            self.buffers = np.empty((2, size, size), dtype=STATE_DTYPE)
+        else:
+            self.buffers = np.memmap(path, dtype=STATE_DTYPE, mode="w+", shape=(2, size, size))
+        self.current = 0
+
+        for r0, r1, c0, c1 in tiles(size, tile_size):
+            rows, cols = np.mgrid[r0:r1, c0:c1]
+            self.state_grid[r0:r1, c0:c1] = initial_cells(self.rng, rows * size + cols)
+        self.state_grid.flat[initial_roads(size)] = ACTIVE_ROAD
+
+        self.roads = RoadAgents(initial_roads(size), (size, size))
+        self.step_count = 0
+        self.changed_per_step = []
+
+    @property
+    def state_grid(self):
+        return self.buffers[self.current]
+
+    def step_tile(self, tile, rng):
+        r0, r1, c0, c1 = tile
+        old, new = self.buffers[self.current], self.buffers[1 - self.current]
+
+        # the tile plus a one cell halo (where the grid has one)
+        h0, h1, w0, w1 = max(r0 - 1, 0), min(r1 + 1, self.size), max(c0 - 1, 0), min(c1 + 1, self.size)
+        window = np.asarray(old[h0:h1, w0:w1])
+        counts = neighbor_counts(window)[:, r0 - h0:r1 - h0, c0 - w0:c1 - w0]
+        state = window[r0 - h0:r1 - h0, c0 - w0:c1 - w0]
+
+        new_tile = apply_rules(state, counts, rng, origin=(r0, c0), width=self.size, rules=self.rules)
+        new[r0:r1, c0:c1] = new_tile
+
+        if not self.track_changes:
+            return np.count_nonzero(new_tile != state)
+        rows, cols = np.nonzero(new_tile != state)
+        return (rows + r0) * self.size + cols + c0 # sorted
+
+    def tile_index(self, cells):
+        # position in tiles() of the tile each flat index is in
+        rows, cols = np.divmod(cells, self.size)
+        return rows // self.tile_size * -(-self.size // self.tile_size) + cols // self.tile_size
+
+    def road_cells(self):
+        # every cell the road heads can write this step: the heads and all their possible targets
+        rows, cols = np.divmod(self.roads.heads, self.size)
+        x, y = rows[:, None] + ROAD_MOVES[:, 0], cols[:, None] + ROAD_MOVES[:, 1]
+        in_bounds = (0 <= x) & (x < self.size) & (0 <= y) & (y < self.size)
+        return np.unique(np.concatenate([self.roads.heads, (x * self.size + y)[in_bounds]]))
+
+    def step(self):
+        rng = self.step_rng()
+        tile_list = list(tiles(self.size, self.tile_size))
+
+        if self.workers > 1:
+            # tiles only write their own part of the next buffer, so they can run side by side
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                changed = list(executor.map(lambda tile: self.step_tile(tile, rng), tile_list))
+        else:
+            changed = [self.step_tile(tile, rng) for tile in tile_list]
+
+        # only the few cells the road heads can write are checked again after the move
+        old, new = self.buffers[self.current], self.buffers[1 - self.current]
+        touched = self.road_cells()
+        was_changed = new.flat[touched] != old.flat[touched]
+        self.roads.advance(new, rng)
+        is_changed = new.flat[touched] != old.flat[touched]
+
+        self.current = 1 - self.current
+        self.step_count += 1
+        if not self.track_changes:
+            self.changed_per_step.append(int(sum(changed)) - int(was_changed.sum()) + int(is_changed.sum()))
+            return None
+
+        # changed cells in tile order (not sorted like in CitySimulation.step), the cells a road head
+        # changed back are taken out of their tile's list and the ones it changed go at the end
+        unchanged = touched[was_changed & ~is_changed]
+        in_tile = self.tile_index(unchanged)
+        for k in np.unique(in_tile).tolist():
+            changed[k] = np.delete(changed[k], np.searchsorted(changed[k], unchanged[in_tile == k]))
+        changed = np.concatenate(changed + [touched[is_changed & ~was_changed]])
+        self.changed_per_step.append(len(changed))
+        return changed
+
+def verify(size, steps, seed, tile_size, workers=1, rules=DEFAULT_RULES):
+    # the tiled run has to match the whole-grid run (same CounterRNG seed) bit for bit, every step
+    whole = CitySimulation(size, seed=seed, rng=CounterRNG(seed), rules=rules)
+    tiled = TiledCitySimulation(size, seed=seed, tile_size=tile_size, workers=workers, rules=rules)
+    counted = TiledCitySimulation(size, seed=seed, tile_size=tile_size, workers=workers, rules=rules, track_changes=False)
+    if not np.array_equal(whole.state_grid, tiled.state_grid):
+        return False
+    for _ in range(steps):
+        changed_whole, changed_tiled = whole.step(), tiled.step()
+        counted.step()
+        if not (np.array_equal(whole.state_grid, tiled.state_grid) and np.array_equal(changed_whole, np.sort(changed_tiled))):
+            return False
+        if not (np.array_equal(whole.state_grid, counted.state_grid) and counted.changed_per_step[-1] == len(changed_whole)):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="step a (very) large city grid tile by tile")
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--path", help="memory-mapped state file, in memory if not given")
+    parser.add_argument("--workers", type=int, default=1, help="tiles stepped in parallel")
+    parser.add_argument("--count-changes", action="store_true", help="only count the changed cells instead of listing them")
+    parser.add_argument("--verify", action="store_true", help="check the result against the whole-grid step instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.size, args.steps, args.seed, args.tile_size, args.workers)
+        print("tiled step is bit-identical to the whole-grid step" if ok else "MISMATCH between tiled and whole-grid step")
+        raise SystemExit(0 if ok else 1)
+
+    simulation = TiledCitySimulation(args.size, args.seed, args.tile_size, args.path, args.workers,
+                                     track_changes=not args.count_changes)
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        simulation.step()
+    elapsed = time.perf_counter() - start
+    print(f"{args.steps} steps on a {args.size}x{args.size} grid ({args.tile_size} tiles) in {elapsed:.2f}s "
+          f"({args.steps / elapsed:.2f} steps/s)")
+
+if __name__ == "__main__":
+    main()
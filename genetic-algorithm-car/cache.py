@@ -0,0 +1,206 @@
+import argparse
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+
+from evaluators import Evaluator, InProcessEvaluator
+from fitness import GENOME_DTYPE, SCENARIOS, evaluate_batch
+from population import CONTINUOUS_GENES, next_generation, random_population
+
+# memoized fitness - a converged population is mostly copies of a few vehicles, and with an expensive
+# fitness function there's no point in scoring the same vehicle again. CachedEvaluator sits in front of
+# any evaluator (evaluators.py) and only passes on the vehicles the cache hasn't seen yet:
+#   evaluator = CachedEvaluator(PoolEvaluator(...), FitnessCache(max_size=100000, decimals=4))
+#
+# the key is the genome with the continuous genes rounded to `decimals` decimal places (None - the exact
+# floats), so with rounding two vehicles that differ by less than that share the score of the first one seen.
+# the least recently used entries are dropped past max_size, and the cache can be saved / loaded (.npz).
+# a saved cache remembers the fitness function that made its scores (module.name, or a version tag given
+# as a string) and can only be loaded for the same one
+#
+# python cache.py --population 20000 --generations 30
+# python cache.py --population 5000 --generations 20 --verify
+
+def key_dtype():
+    # GENOME_DTYPE with the continuous genes as int64 - rounded to the precision, or the raw bits of the float
+    return np.dtype([(name, np.int64 if name in CONTINUOUS_GENES else GENOME_DTYPE[name])
+                     for name in GENOME_DTYPE.names])
+
+KEY_DTYPE = key_dtype()
+
+def canonical_keys(population, decimals=None):
+    # one fixed-size bytes value (np.void) per vehicle, equal for vehicles that are the same up to the rounding
+    keys = np.zeros(len(population), dtype=KEY_DTYPE)
+    for name in GENOME_DTYPE.names:
+        if name not in CONTINUOUS_GENES:
+            keys[name] = population[name]
+        elif decimals is None:
+            keys[name] = population[name].view(np.int64)
+        else:
+            keys[name] = np.round(population[name] * 10**decimals)
+    return keys.view(f"V{KEY_DTYPE.itemsize}")
+
+def fitness_id(fitness):
+    # a fitness function -> "module.name", a string (an explicit version tag) stays as it is
+    return fitness if isinstance(fitness, str) else f"{fitness.__module__}.{fitness.__qualname__}"
+
+class FitnessCache:
+    # fitness - the function the cached scores come from (see fitness_id)
+    def __init__(self, max_size=100000, decimals=None, fitness=evaluate_batch):
+        self.max_size = max_size
+        self.decimals = decimals
+        self.fitness = fitness_id(fitness)
+        self.scores = OrderedDict() # (scenario, key) -> score, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.scores)
+
+    def get(self, scenario, key):
+        score = self.scores.get((scenario, key))
+        if score is not None:
+            self.scores.move_to_end((scenario, key))
+        return score
+
+    def put(self, scenario, key, score):
+        # not a real score (-inf / nan - e.g. PoolEvaluator's timeout_score) - not cached, the vehicle is scored again next time
+        if not np.isfinite(score):
+            return
+        self.scores[(scenario, key)] = score
+        self.scores.move_to_end((scenario, key))
+        while len(self.scores) > self.max_size:
+            self.scores.popitem(last=False)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def save(self, path):
+        # oldest first, so a loaded cache evicts in the same order. written next to the file and then
+        # renamed over it, so an interrupted save doesn't leave a broken cache behind
+        items = list(self.scores.items())
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path,
+                 decimals=np.array(-1 if self.decimals is None else self.decimals),
+                 fitness=np.array(self.fitness),
+                 scenarios=np.array([scenario for (scenario, _), _ in items], dtype=str),
+                 keys=np.array([key for (_, key), _ in items], dtype=f"V{KEY_DTYPE.itemsize}"),
+                 scores=np.array([score for _, score in items], dtype=np.float64))
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        # adds the saved entries (a cache of another fitness function, with different rounding or another
+        # genome layout can't be reused)
+        with np.load(path) as saved:
+            fitness = str(saved["fitness"]) if "fitness" in saved else None
+            if fitness != self.fitness:
+                raise ValueError(f"{path} has the scores of {fitness or 'an unknown fitness function'}, not {self.fitness}")
+            decimals = int(saved["decimals"])
+            decimals = None if decimals < 0 else decimals
+            if decimals != self.decimals:
+                raise ValueError(f"{path} was saved with decimals={decimals}, not {self.decimals}")
+            if saved["keys"].dtype.itemsize != KEY_DTYPE.itemsize:
+                raise ValueError(f"{path} was saved for another genome layout")
+            for scenario, key, score in zip(saved["scenarios"].tolist(), saved["keys"].tolist(), saved["scores"].tolist()):
+                self.put(scenario, key, score)
+
+class CachedEvaluator(Evaluator):
+    # every vehicle looked up once per call - the copies within one population count as hits too,
+    # only the first of them is scored
+    def __init__(self, evaluator, cache):
+        self.evaluator = evaluator
+        self.cache = cache
+        self.fitness = evaluator.fitness
+
+    def __call__(self, population, scenario):
+        keys = canonical_keys(population, self.cache.decimals)
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        unique_scores = np.empty(len(unique_keys), dtype=np.float64)
+        missing = []
+        for k, key in enumerate(unique_keys.tolist()):
+            score = self.cache.get(scenario, key)
+            if score is None:
+                missing.append(k)
+            else:
+                unique_scores[k] = score
+
+        if missing:
+            missing = np.array(missing)
+            unique_scores[missing] = self.evaluator(np.take(population, first[missing]), scenario)
+            for k in missing.tolist():
+                self.cache.put(scenario, unique_keys[k].tobytes(), float(unique_scores[k]))
+
+        self.cache.misses += len(missing)
+        self.cache.hits += len(population) - len(missing)
+        return unique_scores[inverse.reshape(-1)]
+
+    def close(self):
+        self.evaluator.close()
+
+class TimingOutEvaluator(Evaluator):
+    # stands in for a PoolEvaluator whose first call timed out half of the vehicles
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, population, scenario):
+        scores = evaluate_batch(population, scenario)
+        if self.calls == 0:
+            scores[::2] = -np.inf
+        self.calls += 1
+        return scores
+
+def verify_timeouts(population, scenario):
+    # vehicles that timed out aren't cached - the next call scores them for real
+    cache = FitnessCache()
+    evaluator = CachedEvaluator(TimingOutEvaluator(), cache)
+    evaluator(population, scenario)
+    if any(not np.isfinite(score) for score in cache.scores.values()):
+        return False
+    return np.array_equal(evaluator(population, scenario), evaluate_batch(population, scenario))
+
+def main():
+    parser = argparse.ArgumentParser(description="run the GA with a fitness cache and show how often it hits")
+    parser.add_argument("--population", type=int, default=20000)
+    parser.add_argument("--generations", type=int, default=30)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="race")
+    parser.add_argument("--cache-size", type=int, default=100000)
+    parser.add_argument("--decimals", type=int, default=None, help="round the continuous genes (default: exact)")
+    parser.add_argument("--mutation-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="save the cache to this .npz at the end")
+    parser.add_argument("--load", help="start from a cache saved with --save")
+    parser.add_argument("--verify", action="store_true", help="also check every cached score against evaluate_batch")
+    args = parser.parse_args()
+
+    cache = FitnessCache(args.cache_size, args.decimals)
+    if args.load:
+        cache.load(args.load)
+    evaluator = CachedEvaluator(InProcessEvaluator(), cache)
+
+    rng = np.random.default_rng(args.seed)
+    population = random_population(args.population, rng)
+    start = time.perf_counter()
+    for generation in range(args.generations):
+        hits, misses = cache.hits, cache.misses
+        scores = evaluator(population, args.scenario)
+        if args.verify and not np.array_equal(scores, evaluate_batch(population, args.scenario)):
+            raise SystemExit(f"generation {generation}: cached scores don't match evaluate_batch")
+        print(f"generation {generation:>3}: {cache.hits - hits:>7} hits {cache.misses - misses:>7} misses, "
+              f"{len(cache)} cached")
+        population = next_generation(population, scores, rng, 3, args.mutation_rate)
+    elapsed = time.perf_counter() - start
+
+    print(f"hit rate {100 * cache.hit_rate():.1f}% ({cache.hits} hits, {cache.misses} misses) in {elapsed:.2f}s")
+    if args.verify:
+        print("cached scores match evaluate_batch")
+        if not verify_timeouts(random_population(1000, rng), args.scenario):
+            raise SystemExit("a timed out score was cached")
+        print("timed out vehicles aren't cached")
+    if args.save:
+        cache.save(args.save)
+
+if __name__ == "__main__":
+    main()
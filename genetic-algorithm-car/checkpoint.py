@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+from engine import Evolution
+from population import random_population
+
+# checkpoints of a run (engine.Evolution) - it can be stopped at any time and continued later, and the rest of the
+# run comes out exactly as if it had never stopped: one .npz with the population (the raw GENOME_DTYPE records)
+# and a JSON header with the generation, the best vehicle so far, the GA settings and the rng state
+#
+# the file is written next to the old one, fsynced and renamed over it, so a run killed in the middle of
+# a save still has the previous checkpoint. saved between generations (the population isn't scored yet)
+#
+# python checkpoint.py --population 100000 --generations 20 --verify
+# (evolve.py --checkpoint run.npz --checkpoint-every 10 --resume)
+
+FORMAT = 1
+
+def save_checkpoint(path, evolution):
+    header = {
+        "format": FORMAT,
+        "generation": evolution.generation,
+        "best": evolution.best,
+        "scenario": evolution.scenario,
+        "tournament_size": evolution.tournament_size,
+        "mutation_rate": evolution.mutation_rate,
+        "count_unique": evolution.count_unique,
+        "rng": evolution.rng.bit_generator.state, # JSON keeps the 128-bit ints of the state exactly
+    }
+    arrays = {"population": evolution.population, "header": np.array(json.dumps(header))}
+    if evolution.scores is not None:
+        arrays["scores"] = evolution.scores
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def load_checkpoint(path, evaluator=None):
+    # the Evolution the checkpoint was saved from (the evaluator isn't saved - it doesn't change the scores)
+    with np.load(path) as saved:
+        header = json.loads(str(saved["header"]))
+        if header["format"] != FORMAT:
+            raise ValueError(f"{path}: checkpoint format {header['format']}, expected {FORMAT}")
+        population = saved["population"]
+        scores = saved["scores"] if "scores" in saved else None
+
+    bit_generator = getattr(np.random, header["rng"]["bit_generator"])()
+    bit_generator.state = header["rng"]
+    evolution = Evolution(population, np.random.Generator(bit_generator), header["scenario"], evaluator,
+                          header["tournament_size"], header["mutation_rate"], header["count_unique"])
+    evolution.generation = header["generation"]
+    evolution.scores = scores
+    evolution.best = tuple(header["best"]) if header["best"] else None
+    return evolution
+
+def without_timings(stats):
+    return {key: value for key, value in stats.items() if not key.endswith("_s")}
+
+def main():
+    parser = argparse.ArgumentParser(description="measure checkpoints and check that a resumed run is the same run")
+    parser.add_argument("--population", type=int, default=100000)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--scenario", default="race")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--every", type=int, default=10, help="generations between checkpoints")
+    parser.add_argument("--path", default="checkpoint-test.npz")
+    parser.add_argument("--verify", action="store_true", help="also stop halfway, resume and compare with the uninterrupted run")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    evolution = Evolution(random_population(args.population, rng), rng, args.scenario)
+    generation_s = save_s = load_s = 0.0
+    saves = 0
+    history = []
+    for generation in range(args.generations):
+        start = time.perf_counter()
+        history.append(evolution.step())
+        generation_s += time.perf_counter() - start
+        if (generation + 1) % args.every == 0 or generation + 1 == args.generations:
+            start = time.perf_counter()
+            save_checkpoint(args.path, evolution)
+            save_s += time.perf_counter() - start
+            start = time.perf_counter()
+            load_checkpoint(args.path)
+            load_s += time.perf_counter() - start
+            saves += 1
+    size = os.path.getsize(args.path)
+    print(f"generation {1000 * generation_s / args.generations:.1f} ms, checkpoint save {1000 * save_s / saves:.1f} ms, "
+          f"load {1000 * load_s / saves:.1f} ms, {size / 2**20:.2f} MB - every {args.every} generations "
+          f"that's {100 * save_s / generation_s:.1f}% of the run")
+
+    if args.verify:
+        rng = np.random.default_rng(args.seed)
+        first_half = Evolution(random_population(args.population, rng), rng, args.scenario)
+        resumed_history = list(first_half.run(args.generations // 2))
+        save_checkpoint(args.path, first_half)
+        resumed = load_checkpoint(args.path)
+        resumed_history += list(resumed.run(args.generations - args.generations // 2))
+        ok = [without_timings(stats) for stats in history] == [without_timings(stats) for stats in resumed_history] and \
+            resumed.population.tobytes() == evolution.population.tobytes() and resumed.best == evolution.best and \
+            resumed.rng.bit_generator.state == evolution.rng.bit_generator.state
+        print("resumed run matches the uninterrupted one" if ok else "MISMATCH between the resumed and the uninterrupted run")
+    os.remove(args.path)
+    if args.verify:
+        raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
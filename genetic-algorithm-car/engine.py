@@ -0,0 +1,69 @@
+import time
+import numpy as np
+
+from evaluators import InProcessEvaluator
+from fitness import genes_from_record
+from population import next_generation
+
+# the GA loop itself, without bpy - final.py shows what it produces in blender, evolve.py runs it headless
+#
+#   evolution = Evolution(random_population(100, rng), rng, scenario="race")
+#   for stats in evolution.run(10):
+#       print(stats["generation"], stats["best_score"], stats["best"])
+#
+# every generation: score the population, report it, breed the next one. the random numbers come only from
+# rng, in the same order as in final.py, so a seed gives the same run here and in blender
+
+class Evolution:
+    # count_unique - also count the different genomes of every generation (a sort of the whole population, about
+    # as slow as breeding it, so it's off by default and "unique" is None then)
+    def __init__(self, population, rng, scenario="race", evaluator=None, tournament_size=3, mutation_rate=0.2,
+                 count_unique=False):
+        self.population = population
+        self.rng = rng
+        self.scenario = scenario
+        self.evaluator = evaluator or InProcessEvaluator()
+        self.tournament_size = tournament_size
+        self.mutation_rate = mutation_rate
+        self.count_unique = count_unique
+        self.generation = 0
+        self.scores = None # of the current population, once it's evaluated
+        self.best = None # (score, genes) of the best vehicle so far
+
+    def evaluate(self):
+        # scores the current population (self.scores) and returns its stats (JSON-friendly, the best genome as the nested dict)
+        start = time.perf_counter()
+        scores = self.scores = self.evaluator(self.population, self.scenario)
+        evaluate_s = time.perf_counter() - start
+
+        best = int(np.argmax(scores)) # the first of the best, like after the stable sort
+        best_score, best_genes = float(scores[best]), genes_from_record(self.population[best])
+        if self.best is None or best_score > self.best[0]:
+            self.best = (best_score, best_genes)
+        return {
+            "generation": self.generation,
+            "best_score": best_score,
+            "mean_score": float(np.mean(scores)),
+            "worst_score": float(np.min(scores)),
+            "unique": len(np.unique(self.population.view(f"V{self.population.dtype.itemsize}"))) if self.count_unique else None,
+            "best": best_genes,
+            "evaluate_s": evaluate_s,
+        }
+
+    def breed(self):
+        # the next generation from the scored one, returns how long that took
+        start = time.perf_counter()
+        self.population = next_generation(self.population, self.scores, self.rng, self.tournament_size, self.mutation_rate)
+        self.scores = None
+        self.generation += 1
+        return time.perf_counter() - start
+
+    def step(self):
+        # one whole generation
+        stats = self.evaluate()
+        stats["breed_s"] = self.breed()
+        return stats
+
+    def run(self, generations):
+        for _ in range(generations):
+            yield self.step()
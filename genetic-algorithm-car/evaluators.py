@@ -0,0 +1,107 @@
+import argparse
+import concurrent.futures
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from fitness import evaluate_batch
+from population import random_population
+
+# where the fitness of a generation is computed. an evaluator is called with the whole population
+# (structured array) and the scenario and returns one score per vehicle, in population order:
+#   scores = evaluator(population, scenario)
+#
+# InProcessEvaluator - evaluate_batch right here, the default (the closed-form scores are cheap)
+# PoolEvaluator - the population is cut into chunks that are scored in worker processes,
+#                 for fitness functions that are expensive per vehicle (e.g. a physics rollout)
+#
+# the fitness function itself is pluggable - anything with the evaluate_batch signature
+# fitness(chunk, scenario) -> scores, defined at module level so the workers can unpickle it
+#
+# python evaluators.py --population 200000 --workers 4 --verify
+
+class Evaluator:
+    # the base scores with self.fitness right here - a subclass decides where the work is done
+    fitness = staticmethod(evaluate_batch)
+
+    def __call__(self, population, scenario):
+        return self.fitness(population, scenario)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class InProcessEvaluator(Evaluator):
+    def __init__(self, fitness=evaluate_batch):
+        self.fitness = fitness
+
+class PoolEvaluator(Evaluator):
+    # chunks are submitted in population order and their results are put back by position,
+    # so the scores never depend on which worker finishes first.
+    # timeout - seconds for a whole generation, the chunks that aren't done by then are cancelled
+    # and their vehicles get timeout_score (-inf: they never win a tournament). a chunk that's already
+    # running can't be stopped - its worker just stays busy until it's done
+    def __init__(self, fitness=evaluate_batch, workers=None, chunk_size=1000, timeout=None, timeout_score=-np.inf):
+        self.fitness = fitness
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.timeout_score = timeout_score
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = []
+        self.timed_out = 0 # vehicles that got timeout_score, over all calls
+
+    def __call__(self, population, scenario):
+        starts = range(0, len(population), self.chunk_size)
+        self.pending = [self.executor.submit(self.fitness, population[start:start + self.chunk_size], scenario)
+                        for start in starts]
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        scores = np.full(len(population), self.timeout_score, dtype=np.float64)
+        for start, future in zip(starts, self.pending):
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                scores[start:start + self.chunk_size] = future.result(timeout=remaining)
+            except (concurrent.futures.TimeoutError, concurrent.futures.CancelledError):
+                future.cancel()
+                self.timed_out += len(scores[start:start + self.chunk_size])
+        self.pending = []
+        return scores
+
+    def cancel(self):
+        # e.g. from another thread - the chunks that haven't started yet are dropped (they get timeout_score)
+        for future in self.pending:
+            future.cancel()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="score a random population in-process and in a process pool")
+    parser.add_argument("--population", type=int, default=200000)
+    parser.add_argument("--scenario", default="race")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="also check that both give the same scores")
+    args = parser.parse_args()
+
+    population = random_population(args.population, np.random.default_rng(args.seed))
+    with InProcessEvaluator() as in_process, PoolEvaluator(workers=args.workers, chunk_size=args.chunk_size) as pool:
+        pool(population[:1], args.scenario) # start the workers
+        for evaluator in (in_process, pool):
+            start = time.perf_counter()
+            evaluator(population, args.scenario)
+            print(f"{type(evaluator).__name__:>20}: {time.perf_counter() - start:.3f}s")
+
+        if args.verify:
+            ok = np.array_equal(in_process(population, args.scenario), pool(population, args.scenario))
+            print("pool scores match" if ok else "MISMATCH between pool and in-process scores")
+            raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
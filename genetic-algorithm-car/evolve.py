@@ -0,0 +1,137 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from cache import CachedEvaluator, FitnessCache
+from checkpoint import load_checkpoint, save_checkpoint
+from engine import Evolution
+from evaluators import InProcessEvaluator, PoolEvaluator
+from fitness import SCENARIOS
+from islands import TOPOLOGIES, IslandModel
+from pareto import ParetoEvolution
+from population import random_population
+
+# the GA without blender, e.g. for trying out hyperparameters on a compute node. writes one JSON line per
+# generation (scores, diversity, timings and the best genome), final.py can show such a file in blender
+# (results_file) instead of evolving there
+#
+# python evolve.py --scenario cargo --seed 1 --generations 200 --population 10000 --unique --stats cargo.jsonl
+# python evolve.py --population 100000 --generations 50 --workers 8
+# python evolve.py --scenario offroad --population 100000 --generations 50 --islands 8 --topology full
+# python evolve.py --pareto --population 2000 --generations 100 --front front.json
+# python evolve.py --population 100000 --generations 5000 --checkpoint run.npz --resume --stats run.jsonl
+#   (after a restart it goes on from the last checkpoint, same results as without the restart)
+
+def main():
+    parser = argparse.ArgumentParser(description="run the car GA headless")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="race")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--generations", type=int, default=10)
+    parser.add_argument("--population", type=int, default=100)
+    parser.add_argument("--mutation-rate", type=float, default=0.2)
+    parser.add_argument("--tournament-size", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None, help="score in a process pool of this many workers (default / 0 - in this process), "
+                                                                     "with --islands: the processes the islands run in (default - one per core, 0 - in this process)")
+    parser.add_argument("--cache-size", type=int, default=0, help="fitness cache entries (0 - no cache)")
+    parser.add_argument("--islands", type=int, default=0, help="split the population into this many islands (islands.py)")
+    parser.add_argument("--interval", type=int, default=5, help="generations between migrations of the islands")
+    parser.add_argument("--migrants", type=int, default=2, help="vehicles every island sends at a migration")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring")
+    parser.add_argument("--pareto", action="store_true", help="all the scenarios at once, keeps the Pareto front (pareto.py)")
+    parser.add_argument("--front", help="with --pareto: write the final front here (JSON)")
+    parser.add_argument("--unique", action="store_true", help="count the different genomes of every generation (slower)")
+    parser.add_argument("--stats", help="per-generation stats (JSON lines), '-' for stdout")
+    parser.add_argument("--checkpoint", help="save the run here (checkpoint.py) every --checkpoint-every generations")
+    parser.add_argument("--checkpoint-every", type=int, default=10)
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint if it's there, "
+                                                              "up to --generations in total (the stats file is appended to)")
+    parser.add_argument("--quiet", action="store_true", help="no progress lines")
+    args = parser.parse_args()
+    if args.islands and (args.cache_size or args.unique):
+        parser.error("--cache-size and --unique don't work with --islands")
+    if args.pareto and (args.islands or args.workers or args.cache_size or args.unique):
+        parser.error("--pareto runs in this process, without --islands, --workers, --cache-size or --unique")
+    if (args.checkpoint or args.resume) and (args.islands or args.pareto):
+        parser.error("checkpoints are only for the single population (no --islands or --pareto)")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+
+    if args.pareto:
+        # (binary tournaments, as in NSGA-II)
+        rng = np.random.default_rng(args.seed)
+        evolution = ParetoEvolution(random_population(args.population, rng), rng, mutation_rate=args.mutation_rate)
+        running = contextlib.nullcontext()
+    elif args.islands:
+        evolution = IslandModel(args.islands, args.population // args.islands, args.seed, args.scenario, args.interval,
+                                args.migrants, args.topology, args.workers, args.tournament_size, args.mutation_rate)
+        running = evolution
+    else:
+        evaluator = PoolEvaluator(workers=args.workers) if args.workers else InProcessEvaluator()
+        if args.cache_size:
+            evaluator = CachedEvaluator(evaluator, FitnessCache(args.cache_size))
+        if args.resume and os.path.exists(args.checkpoint):
+            # the settings come from the checkpoint
+            evolution = load_checkpoint(args.checkpoint, evaluator)
+            print(f"resuming {args.checkpoint} at generation {evolution.generation}", file=sys.stderr)
+        else:
+            rng = np.random.default_rng(args.seed)
+            evolution = Evolution(random_population(args.population, rng), rng, args.scenario, evaluator,
+                                  args.tournament_size, args.mutation_rate, args.unique)
+        running = evolution.evaluator
+    generations = args.generations - evolution.generation
+    stats_file = None
+    if args.stats and args.stats != "-" and args.resume and os.path.exists(args.stats):
+        # the generations after the checkpoint are run again, their old lines go
+        with open(args.stats) as f:
+            lines = [line for line in f if line.strip() and json.loads(line)["generation"] < evolution.generation]
+        with open(args.stats, "w") as f:
+            f.writelines(lines)
+    if args.stats:
+        stats_file = sys.stdout if args.stats == "-" else open(args.stats, "a" if args.resume else "w")
+
+    evaluate_s = breed_s = checkpoint_s = 0.0
+    start = time.perf_counter()
+    with running:
+        for stats in evolution.run(generations):
+            evaluate_s += stats["evaluate_s"]
+            breed_s += stats.get("breed_s", 0.0) # (the islands breed in their workers)
+            if stats_file:
+                stats_file.write(json.dumps(stats) + "\n")
+            if args.checkpoint and (evolution.generation % args.checkpoint_every == 0 or evolution.generation == args.generations):
+                # the stats of the saved generations have to be on disk before the checkpoint that's past them
+                if stats_file:
+                    stats_file.flush()
+                checkpoint_start = time.perf_counter()
+                save_checkpoint(args.checkpoint, evolution)
+                checkpoint_s += time.perf_counter() - checkpoint_start
+            if args.quiet or stats_file is sys.stdout:
+                continue
+            if args.pareto:
+                print(f"generation {stats['generation']:>5}: front of {stats['front_size']}, best " +
+                      "  ".join(f"{scenario} {score:.3f}" for scenario, score in stats["best_scores"].items()))
+            else:
+                print(f"generation {stats['generation']:>5}: best {stats['best_score']:10.3f}  "
+                      f"mean {stats['mean_score']:10.3f}" + (f"  unique {stats['unique']}" if args.unique else ""))
+    elapsed = time.perf_counter() - start
+    if stats_file and stats_file is not sys.stdout:
+        stats_file.close()
+
+    if args.pareto:
+        front = evolution.front()
+        print(f"Pareto front of {len(front)} different vehicles", file=sys.stderr)
+        if args.front:
+            with open(args.front, "w") as f:
+                json.dump([{"scores": scores, "genes": genes} for scores, genes in front], f, indent=1)
+    else:
+        print(f"best score {evolution.best[0]}: {json.dumps(evolution.best[1])}", file=sys.stderr)
+    print(f"{generations} generations of {len(evolution.population) if not args.islands else args.population} in {elapsed:.3f}s "
+          f"({generations / elapsed:.1f} generations/s, evaluate {evaluate_s:.3f}s, breed {breed_s:.3f}s"
+          + (f", checkpoints {checkpoint_s:.3f}s" if args.checkpoint else "") + ")",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
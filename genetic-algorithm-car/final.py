@@ -1,18 +1,64 @@
+import json
+import os
+import sys
 import bpy
-import random
 import math
+import numpy as np
+
+# blender doesn't put the script's directory on sys.path by itself
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from cache import CachedEvaluator, FitnessCache
+from evaluators import InProcessEvaluator
+from engine import Evolution
+from fitness import genes_from_record, unpack_genes
+from islands import IslandModel
+from population import random_population
 
 # GA hyperparameters
 population_size = 100
 generations = 10
 mutation_rate = 0.2
 tournament_size = 3
+seed = None # same seed, same run as python evolve.py --seed
+
+# island model (islands.py) - 0: one population, k: k islands of population_size // k evolving in worker processes,
+# the best migration_size of each move to the next island (migration_topology 'ring') or to all of them ('full')
+islands = 0
+migration_interval = 5
+migration_size = 2
+migration_topology = 'ring'
 
 view_vehicle_duration = 48
 total_frames = generations * view_vehicle_duration
 
 scenario = 'race'
 
+# a stats file from evolve.py (JSON lines) - shows the best vehicles of that run instead of evolving here
+results_file = None
+
+# how the best vehicles are shown: 'copies' - a new Vehicle_{n} collection for every generation,
+# 'rig' - one rig per vehicle type, every generation is just keyframes on it (the scene doesn't grow with the generations)
+display_mode = 'copies'
+
+# how the population gets scored (evaluators.py) - in this process by default,
+# lambda: PoolEvaluator(workers=8, chunk_size=1000, timeout=60) for expensive fitness functions (from evaluators import PoolEvaluator)
+make_evaluator = InProcessEvaluator
+
+# fitness cache in front of the evaluator (cache.py) - 0 turns it off. decimals rounds the continuous genes
+# of the key (None - only exact copies share a score), cache_file keeps the cache between runs
+cache_size = 10000
+cache_decimals = None
+cache_file = None
+
+def make_cached_evaluator():
+    evaluator = make_evaluator()
+    if not cache_size:
+        return evaluator
+    cache = FitnessCache(cache_size, cache_decimals, evaluator.fitness)
+    if cache_file and os.path.exists(cache_file):
+        cache.load(cache_file)
+    return CachedEvaluator(evaluator, cache)
+
 def clear_scene():
     bpy.ops.object.select_all(action='SELECT')
     bpy.ops.object.delete(use_global=False)
@@ -44,33 +90,58 @@ def create_plane():
     
     plane.data.materials.append(mat)
 
-def unpack_genes(genes):
-    return (
-        genes["vehicle_type"],
-        genes["continuous"]["body_width"],
-        genes["continuous"]["body_height"],
-        genes["continuous"]["body_length"],
-        genes["continuous"]["wheel_thickness"],
-        genes["binary"]["is_red"],
-        genes["binary"]["has_spoiler"],
-        genes["binary"]["has_bullbar"],
-        genes["roof_rack"]["has_poles"],
-        genes["roof_rack"]["has_modules"]
-    )
+# vehicle templates - every .blend is read once, into a hidden collection of master objects. a shown vehicle
+# is made of copies of them (obj.copy() shares the mesh), so the libraries, meshes and materials don't
+# grow with the number of generations, only the (cheap) objects do
+templates = {} # vehicle_type -> hidden master collection
 
-def load_vehicle(genes, frame, offset=0):
-    vehicle_type, body_width, body_height, body_length, wheel_thickness, is_red, has_spoiler, has_bullbar, \
-         has_poles, has_modules = unpack_genes(genes)
-    # filepath = f"{vehicle_type}.blend"
-    filepath = f"C:\\wsl2\\home\\blato\\everything\\ProgramowanieWspomaganeKomputerem-2024.25\\genetic-algorithm-car\\{vehicle_type}.blend"
-    with bpy.data.libraries.load(filepath, link=False) as (data_from, data_to):
+def vehicle_filepath(vehicle_type):
+    # return f"{vehicle_type}.blend"
+    return f"C:\\wsl2\\home\\blato\\everything\\ProgramowanieWspomaganeKomputerem-2024.25\\genetic-algorithm-car\\{vehicle_type}.blend"
+
+def vehicle_template(vehicle_type):
+    if vehicle_type in templates:
+        return templates[vehicle_type]
+
+    with bpy.data.libraries.load(vehicle_filepath(vehicle_type), link=False) as (data_from, data_to):
         data_to.objects = [name for name in data_from.objects]
-    
-    # new!
-    collection_name = f"Vehicle_{frame // view_vehicle_duration}"
-    vehicle_collection = bpy.data.collections.new(collection_name)
-    bpy.context.scene.collection.children.link(vehicle_collection)
 
+    template = bpy.data.collections.new(f"Template_{vehicle_type}")
+    bpy.context.scene.collection.children.link(template)
+    template.hide_viewport = True
+    template.hide_render = True
+    for obj in data_to.objects:
+        if obj is not None:
+            template.objects.link(obj)
+            # the colour goes into an object-linked slot (the mesh is shared), so the body needs at least one slot
+            if 'body' in obj.name.lower() and obj.type == 'MESH' and not obj.data.materials:
+                obj.data.materials.append(None)
+
+    templates[vehicle_type] = template
+    return template
+
+def vehicle_objects(vehicle_type):
+    # copies of the master objects, with the parents pointing at the copies (wheels hang on empties)
+    masters = list(vehicle_template(vehicle_type).objects)
+    copies = {master: master.copy() for master in masters}
+    for master, obj in copies.items():
+        if master.parent in copies:
+            obj.parent = copies[master.parent]
+            obj.matrix_parent_inverse = master.matrix_parent_inverse.copy()
+    return [copies[master] for master in masters]
+
+BODY_COLORS = {True: ("RedMaterial", (0.8, 0.1, 0.1, 1)), False: ("BlueMaterial", (0.2, 0.2, 0.7, 1))} # is_red -> RGBA
+
+def body_material(is_red):
+    # two shared materials instead of a new one for every shown vehicle
+    name, color = BODY_COLORS[bool(is_red)]
+    mat = bpy.data.materials.get(name)
+    if mat is None:
+        mat = bpy.data.materials.new(name=name)
+        mat.diffuse_color = color
+    return mat
+
+def vehicle_parts(objects):
     # main parts:
     body = None
     wheels = []
@@ -88,10 +159,8 @@ def load_vehicle(genes, frame, offset=0):
     cargo_boxes = []
     big_cargo_boxes = []
     
-    for obj in data_to.objects:
+    for obj in objects:
         if obj is not None:
-            # bpy.context.scene.collection.objects.link(obj)
-            vehicle_collection.objects.link(obj)
             if 'body' in obj.name.lower():
                 body = obj
             elif 'wheel' in obj.name.lower():
@@ -111,6 +180,36 @@ def load_vehicle(genes, frame, offset=0):
             elif 'cargo-box' in obj.name.lower():
                 cargo_boxes.append(obj)
 
+    return {"body": body, "wheels": wheels, "spoiler": spoiler, "bullbar": bullbar, "roof_rack": roof_rack,
+            "poles": poles, "solar_panels": solar_panels, "cargo_boxes": cargo_boxes, "big_cargo_boxes": big_cargo_boxes}
+
+def module_visibility(parts, has_modules):
+    # (object, visible) for every module slot
+    shown = {"solar-panel": parts["solar_panels"], "cargo-box": parts["cargo_boxes"], "big-cargo-box": parts["big_cargo_boxes"]}
+    visibility = []
+    for i in range(3):
+        for module, objects in shown.items():
+            visibility.append((objects[i], i < len(has_modules) and has_modules[i] == module))
+    return visibility
+
+def load_vehicle(genes, frame, offset=0):
+    vehicle_type, body_width, body_height, body_length, wheel_thickness, is_red, has_spoiler, has_bullbar, \
+         has_poles, has_modules = unpack_genes(genes)
+    objects = vehicle_objects(vehicle_type)
+    
+    # new!
+    collection_name = f"Vehicle_{frame // view_vehicle_duration}"
+    vehicle_collection = bpy.data.collections.new(collection_name)
+    bpy.context.scene.collection.children.link(vehicle_collection)
+
+    for obj in objects:
+        if obj is not None:
+            # bpy.context.scene.collection.objects.link(obj)
+            vehicle_collection.objects.link(obj)
+    parts = vehicle_parts(objects)
+    body, wheels, spoiler, bullbar = parts["body"], parts["wheels"], parts["spoiler"], parts["bullbar"]
+    poles = parts["poles"]
+
     if not (body and len(wheels)) == 4:
         return 1
     
@@ -123,14 +222,9 @@ def load_vehicle(genes, frame, offset=0):
     for wheel in wheels:
         wheel.scale.z *= wheel_thickness
 
-    if is_red:
-        mat = bpy.data.materials.new(name="RedMaterial")
-        mat.diffuse_color = (0.8, 0.1, 0.1, 1)  # RGBA for red
-        body.data.materials.append(mat)
-    else:
-        mat = bpy.data.materials.new(name="BlueMaterial")
-        mat.diffuse_color = (0.2, 0.2, 0.7, 1)
-        body.data.materials.append(mat)
+    # on the object, not on the mesh every copy of this body shares
+    body.material_slots[0].link = 'OBJECT'
+    body.material_slots[0].material = body_material(is_red)
 
     spoiler.hide_viewport = not has_spoiler
     bullbar.hide_viewport = not has_bullbar
@@ -139,18 +233,8 @@ def load_vehicle(genes, frame, offset=0):
         # pole.hide_viewport = not has_poles[i] == i #?
         pole.hide_viewport = not (i < has_poles)
 
-    for i in range(3):
-        solar_panels[i].hide_viewport = True
-        cargo_boxes[i].hide_viewport = True
-        big_cargo_boxes[i].hide_viewport = True
-
-    for i, has_module in enumerate(has_modules):
-        if has_module == "solar-panel":
-            solar_panels[i].hide_viewport = False
-        elif has_module == "cargo-box":
-            cargo_boxes[i].hide_viewport = False
-        elif has_module == "big-cargo-box":
-            big_cargo_boxes[i].hide_viewport = False
+    for obj, visible in module_visibility(parts, has_modules):
+        obj.hide_viewport = not visible
 
     start_frame = frame
     end_frame = frame + view_vehicle_duration  # 2 seconds at 24 fps
@@ -165,192 +249,153 @@ def load_vehicle(genes, frame, offset=0):
         if frame != 0:
             obj.keyframe_insert(data_path="hide_viewport", frame=0)
 
-def evaluate(genes):
-    if not genes:
-        return 1
+# rig display - one copy of the template per vehicle type for the whole run, and a shown genome is only keyframes
+# on it (scales, the body colour, what's visible). the keys are constant, so every generation is shown as it is
+rigs = {} # vehicle_type -> {"objects", "parts", "material", "scale", "location"}
 
+def vehicle_rig(vehicle_type):
+    if vehicle_type in rigs:
+        return rigs[vehicle_type]
+
+    objects = [obj for obj in vehicle_objects(vehicle_type) if obj is not None]
+    collection = bpy.data.collections.new(f"Rig_{vehicle_type}")
+    bpy.context.scene.collection.children.link(collection)
+    for obj in objects:
+        collection.objects.link(obj)
+        # hidden until the first time this type is shown
+        obj.hide_viewport = True
+        obj.keyframe_insert(data_path="hide_viewport", frame=0)
+
+    parts = vehicle_parts(objects)
+    material = bpy.data.materials.new(name=f"Rig_{vehicle_type}_Body") # its colour is keyframed
+    if parts["body"] is not None:
+        parts["body"].material_slots[0].link = 'OBJECT'
+        parts["body"].material_slots[0].material = material
+
+    rigs[vehicle_type] = {
+        "objects": objects,
+        "parts": parts,
+        "material": material,
+        # the template's own transforms, the genes scale them
+        "scale": {obj.name: tuple(obj.scale) for obj in objects},
+        "location": {obj.name: tuple(obj.location) for obj in objects},
+    }
+    return rigs[vehicle_type]
+
+def show_on_rig(genes, frame, offset=0):
     vehicle_type, body_width, body_height, body_length, wheel_thickness, is_red, has_spoiler, has_bullbar, \
          has_poles, has_modules = unpack_genes(genes)
+    rig = vehicle_rig(vehicle_type)
+    parts = rig["parts"]
+    body, wheels = parts["body"], parts["wheels"]
+    if not (body and len(wheels)) == 4:
+        return 1
 
-    # aerodynamics score - prefer long and low cars. "Is red" and "has spoiler" are bonuses
-    aero_score = (body_length / body_width) * (body_length / body_height) * 10 + \
-        is_red * 5 + \
-        has_spoiler * 5 - \
-        has_bullbar * 5
-    fuel_efficiency = -(body_width * body_height * body_length) + aero_score * 0.5
-    weight = body_width * body_height * body_length + wheel_thickness + \
-        10 if has_spoiler else 1 + \
-        10 if has_bullbar else 1    
-    friction_penalty = wheel_thickness * 10
-    cargo_score = body_width * body_height * body_length
-    offroad_score = wheel_thickness * 15 + has_bullbar * 10
-    cost_penalty = has_spoiler * 10 + has_bullbar * 10
-    
-    pre_roof_score = 0
-    if scenario == 'race':
-        pre_roof_score = aero_score - friction_penalty
-    elif scenario == 'cargo':
-        pre_roof_score = cargo_score - cost_penalty
-    elif scenario == 'offroad':
-        pre_roof_score = offroad_score
-    elif scenario == 'city':
-        pre_roof_score = fuel_efficiency - weight - cost_penalty
-
-    roof_score = 0
-    for module in has_modules:
-        if module == "solar-panel":
-            roof_score += 10 if (scenario == "city" or scenario == "offroad") else -5
-        elif module == "cargo-box":
-            roof_score += 10 if (scenario == "cargo" or scenario == "offroad") else -5
-        elif module == "big-cargo-box":
-            roof_score += 15 if scenario == "cargo" else -10
-
-    # dodatkowa nagroda za połączone duże skrzynie
-    if has_modules == ["big-cargo-box", "big-cargo-box", "big-cargo-box"] and \
-       scenario == "cargo":
-        roof_score += 20
-    elif has_modules[:-1] == ["big-cargo-box", "big-cargo-box"] or \
-       has_modules[1:] == ["big-cargo-box", "big-cargo-box"] and \
-       scenario == "cargo":
-        roof_score += 10
-
-    # penalize unused poles (extra weight without benefit) no matter the car type
-    unused_poles = has_modules.count(None) - (3-has_poles)
-    roof_score -= unused_poles * 5
-
-    return pre_roof_score + roof_score
-
-def create_random_genes():
-    has_poles = random.randint(0, 3)
-    has_modules = [
-        random.choice(["solar-panel", "cargo-box", "big-cargo-box", None])
-        for _ in range(has_poles)
-    ]
-    has_modules.extend([None] * (3 - has_poles))
-
-    genes = {
-        "binary": {
-            "is_red": random.random() < 0.5,
-            "has_spoiler": random.random() < 0.5,
-            "has_bullbar": random.random() < 0.5
-        },
-        "continuous": {
-            "body_width": random.uniform(0.75, 1.5),
-            "body_height": random.uniform(0.75, 1.5),
-            "body_length": random.uniform(0.75, 1.5),
-            "wheel_thickness": random.uniform(0.75, 1.5)
-        },
-        "vehicle_type": random.choice(["GA-pickup", "GA-truck"]),
-        "roof_rack": {
-            "has_poles": has_poles,
-            "has_modules": has_modules
-        }
-    }
+    # the rigs of the other types go away
+    for other in rigs.values():
+        if other is not rig:
+            for obj in other["objects"]:
+                obj.hide_viewport = True
+                obj.keyframe_insert(data_path="hide_viewport", frame=frame)
 
-    return genes
+    x, y, z = rig["scale"][body.name]
+    body.scale = (x * body_width, y * body_length, z * body_height) # bad names, like in load_vehicle
+    body.location.x = rig["location"][body.name][0] + offset
+    body.keyframe_insert(data_path="scale", frame=frame)
+    body.keyframe_insert(data_path="location", frame=frame)
 
-def mutate(genes):
-    mutated_genes = genes.copy()
-    
-    if random.random() < mutation_rate:
-        mutated_genes["vehicle_type"] = random.choice(["GA-pickup", "GA-truck"])
-    for continuous_gene in mutated_genes["continuous"]:
-        mutated_genes["continuous"][continuous_gene] += random.uniform(-0.15, 0.15)
-        mutated_genes["continuous"][continuous_gene] = max(0.4, min(1.8, mutated_genes["continuous"][continuous_gene]))
-    for binary_gene in mutated_genes["binary"]:
-        if random.random() < mutation_rate:
-            mutated_genes["binary"][binary_gene] = not mutated_genes["binary"][binary_gene]
-
-    # roof rack mutations        
-    mutated_genes["roof_rack"]["has_poles"] += random.randint(-1, 1)
-    mutated_genes["roof_rack"]["has_poles"] = max(0, min(3, mutated_genes["roof_rack"]["has_poles"]))
-    mutated_genes["roof_rack"]["has_modules"] = [random.choice(["solar-panel", "cargo-box", "big-cargo-box", None]) 
-                                                 if random.random() < mutation_rate 
-                                                 else module 
-                                                 for module in mutated_genes["roof_rack"]["has_modules"][:mutated_genes["roof_rack"]["has_poles"]]
-                                                 ] # po else chyba za malo
-    # >>> A
-    # [1, 2, 3]
-    # >>> A[:4]
-    # [1, 2, 3]
-    while len(mutated_genes["roof_rack"]["has_modules"]) < 3:
-        mutated_genes["roof_rack"]["has_modules"].append(None) #?
-    
-    return mutated_genes
-
-def crossover(genes1, genes2):
-    genes = { "binary": {}, "continuous": {}, "vehicle_type": 0, "roof_rack": { "has_poles": 0, "has_modules": [] } }
-    for binary_gene in genes1["binary"]:
-        genes["binary"][binary_gene] = random.choice([genes1["binary"][binary_gene], genes2["binary"][binary_gene]])
-    for continuous_gene in genes1["continuous"]:
-        genes["continuous"][continuous_gene] = random.choice([genes1["continuous"][continuous_gene], genes2["continuous"][continuous_gene]])
-    genes["vehicle_type"] = random.choice([genes1["vehicle_type"], genes2["vehicle_type"]])
-        
-    # roof rack crossover
-    genes["roof_rack"]["has_poles"] = random.choice([genes1["roof_rack"]["has_poles"], genes2["roof_rack"]["has_poles"]])
-
-    valid_modules1 = genes1["roof_rack"]["has_modules"][:genes1["roof_rack"]["has_poles"]]
-    valid_modules2 = genes2["roof_rack"]["has_modules"][:genes2["roof_rack"]["has_poles"]]
-
-    for i in range(genes["roof_rack"]["has_poles"]):
-        # obu rodziców ma moduł na danym miejscu
-        if i < len(valid_modules1) and i < len(valid_modules2):
-            module = random.choice([valid_modules1[i], valid_modules2[i]])
-        # rodzic 1 ma moduł na danym miejscu
-        elif i < len(valid_modules1):
-            module = valid_modules1[i]
-        # rodzic 2 ma moduł na danym miejscu
-        elif i < len(valid_modules2):
-            module = valid_modules2[i]
-        # żaden rodzic nie ma modułu na danym miejscu
-        else:
-            module = None
-        genes["roof_rack"]["has_modules"].append(module)
-
-    return genes
-
-def tournament_selection(population, tournament_size, n_parents):
-    selected_parents = []
-    for _ in range(n_parents):
-        tournament = random.sample(population, tournament_size)
-        winner = max(tournament, key=lambda x: x[0])
-        selected_parents.append(winner)
-    return selected_parents
-
-def genetic_algorithm():
-    population = [create_random_genes() for _ in range(population_size)]
-    load_vehicle(population[0], 0) #, -5) # reference to see the progress
-    best_vehicle = None
-
-    for generation in range(generations):
-        vehicles = []
-        for genes in population:
-            score = evaluate(genes)
-            vehicles.append((score, genes))
-
-        vehicles.sort(reverse=True, key=lambda x: x[0])
-        best_score, best_genes = vehicles[0][0], vehicles[0][1]
-        if best_vehicle is None or best_score > best_vehicle[0]:
-            best_vehicle = (best_score, best_genes)
-        print(f"Generation {generation + 1}: best score = {best_score}")
+    for wheel in wheels:
+        wheel.scale.z = rig["scale"][wheel.name][2] * wheel_thickness
+        wheel.keyframe_insert(data_path="scale", frame=frame)
+
+    rig["material"].diffuse_color = BODY_COLORS[bool(is_red)][1]
+    rig["material"].keyframe_insert(data_path="diffuse_color", frame=frame)
+
+    visible = {parts["spoiler"]: has_spoiler, parts["bullbar"]: has_bullbar}
+    for i, pole in enumerate(parts["poles"]):
+        visible[pole] = i < has_poles
+    visible.update(module_visibility(parts, has_modules))
+    for obj in rig["objects"]:
+        obj.hide_viewport = not visible.get(obj, True)
+        obj.keyframe_insert(data_path="hide_viewport", frame=frame)
+
+def finish_rigs():
+    # a generation is shown as it is until the next one - no blending of the scales and colours in between
+    animated = [obj for rig in rigs.values() for obj in rig["objects"]] + [rig["material"] for rig in rigs.values()]
+    for datablock in animated:
+        if datablock.animation_data and datablock.animation_data.action:
+            for fcurve in datablock.animation_data.action.fcurves:
+                for keyframe in fcurve.keyframe_points:
+                    keyframe.interpolation = 'CONSTANT'
+
+def show_vehicle(genes, frame, offset=0):
+    if display_mode == 'rig':
+        return show_on_rig(genes, frame, offset)
+    return load_vehicle(genes, frame, offset)
+
+def finish_display():
+    if display_mode == 'rig':
+        finish_rigs()
+    print(f"datablocks: {len(bpy.data.libraries)} libraries, {len(bpy.data.meshes)} meshes, "
+          f"{len(bpy.data.materials)} materials, {len(bpy.data.objects)} objects")
+
+def genetic_algorithm(evaluator=None):
+    # the evolution itself is engine.Evolution (no bpy in there), this only shows its best vehicles
+    if islands:
+        # the islands score in their own processes - no evaluator, no fitness cache
+        if evaluator is not None:
+            raise ValueError("island mode scores in the islands' own processes, it doesn't take an evaluator")
+        evolution = IslandModel(islands, population_size // islands, seed, scenario, migration_interval, migration_size,
+                                migration_topology, tournament_size=tournament_size, mutation_rate=mutation_rate)
+        population = evolution.islands[0].population
+    else:
+        rng = np.random.default_rng(seed)
+        population = random_population(population_size, rng)
+        evolution = Evolution(population, rng, scenario, evaluator, tournament_size, mutation_rate)
+    show_vehicle(genes_from_record(population[0]), 0) #, -5) # reference to see the progress
+
+    for stats in evolution.run(generations):
+        generation = stats["generation"]
+        print(f"Generation {generation + 1}: best score = {stats['best_score']}")
+        if isinstance(evaluator, CachedEvaluator):
+            print(f"  fitness cache: {evaluator.cache.hits} hits, {evaluator.cache.misses} misses")
 
         if generation != 0:
-            load_vehicle(best_genes, generation*view_vehicle_duration)
-
-        parents = tournament_selection(vehicles, tournament_size, population_size)
-        new_population = []
-        for _ in range(population_size):
-            parent1, parent2 = random.sample(parents, 2)
-            child_genes = crossover(parent1[1], parent2[1])
-            if random.random() < mutation_rate:
-                child_genes = mutate(child_genes)
-            new_population.append(child_genes)
-        population = new_population
-
-    load_vehicle(best_vehicle[1], generations*view_vehicle_duration) #, 5)
-    print(f"Evolution complete - best score: {best_vehicle[0]}")
-
-bpy.context.scene.frame_end = total_frames
-clear_scene()
-create_plane()
-genetic_algorithm()
+            show_vehicle(stats["best"], generation*view_vehicle_duration)
+
+    if islands:
+        evolution.close()
+    show_vehicle(evolution.best[1], generations*view_vehicle_duration) #, 5)
+    finish_display()
+    print(f"Evolution complete - best score: {evolution.best[0]}")
+
+def show_results(path):
+    # a run of evolve.py - the best of every generation (the first one instead of the random reference), then the best overall
+    with open(path) as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    best = None
+    for stats in results:
+        show_vehicle(stats["best"], stats["generation"]*view_vehicle_duration)
+        if best is None or stats["best_score"] > best["best_score"]:
+            best = stats
+    show_vehicle(best["best"], len(results)*view_vehicle_duration)
+    finish_display()
+    print(f"{path}: {len(results)} generations - best score: {best['best_score']}")
+    return len(results)
+
+if __name__ == "__main__":
+    clear_scene()
+    create_plane()
+    if results_file:
+        bpy.context.scene.frame_end = show_results(results_file) * view_vehicle_duration
+    else:
+        bpy.context.scene.frame_end = total_frames
+        if islands:
+            if make_evaluator is not InProcessEvaluator or cache_size:
+                print("island mode: make_evaluator and the fitness cache aren't used, the islands score in their own processes")
+            genetic_algorithm()
+        else:
+            with make_cached_evaluator() as evaluator:
+                genetic_algorithm(evaluator)
+                if cache_file and isinstance(evaluator, CachedEvaluator):
+                    evaluator.cache.save(cache_file)
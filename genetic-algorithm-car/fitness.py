@@ -0,0 +1,262 @@
+import argparse
+import random
+import time
+import numpy as np
+
+# scoring of the vehicles - no bpy in here, so it can be run / benchmarked outside of blender
+#
+# evaluate(genes, scenario) scores one nested-dict genome (the original version),
+# evaluate_batch(columns, scenario) scores a whole population at once from a structured array
+# (GENOME_DTYPE, see population.py / genes_to_columns) and gives exactly the same numbers
+#
+# python fitness.py --population 100000
+# python fitness.py --population 20000 --verify
+
+SCENARIOS = ["race", "cargo", "offroad", "city"]
+VEHICLE_TYPES = ["GA-pickup", "GA-truck"]
+MODULES = [None, "solar-panel", "cargo-box", "big-cargo-box"] # module codes, 0 = empty slot
+NO_MODULE, SOLAR_PANEL, CARGO_BOX, BIG_CARGO_BOX = range(len(MODULES))
+MAX_POLES = 3
+
+def unpack_genes(genes):
+    return (
+        genes["vehicle_type"],
+        genes["continuous"]["body_width"],
+        genes["continuous"]["body_height"],
+        genes["continuous"]["body_length"],
+        genes["continuous"]["wheel_thickness"],
+        genes["binary"]["is_red"],
+        genes["binary"]["has_spoiler"],
+        genes["binary"]["has_bullbar"],
+        genes["roof_rack"]["has_poles"],
+        genes["roof_rack"]["has_modules"]
+    )
+
+def evaluate(genes, scenario):
+    if not genes:
+        return 1
+
+    vehicle_type, body_width, body_height, body_length, wheel_thickness, is_red, has_spoiler, has_bullbar, \
+         has_poles, has_modules = unpack_genes(genes)
+
+    # aerodynamics score - prefer long and low cars. "Is red" and "has spoiler" are bonuses
+    aero_score = (body_length / body_width) * (body_length / body_height) * 10 + \
+        is_red * 5 + \
+        has_spoiler * 5 - \
+        has_bullbar * 5
+    fuel_efficiency = -(body_width * body_height * body_length) + aero_score * 0.5
+    weight = body_width * body_height * body_length + wheel_thickness + \
+        10 if has_spoiler else 1 + \
+        10 if has_bullbar else 1
+    friction_penalty = wheel_thickness * 10
+    cargo_score = body_width * body_height * body_length
+    offroad_score = wheel_thickness * 15 + has_bullbar * 10
+    cost_penalty = has_spoiler * 10 + has_bullbar * 10
+
+    pre_roof_score = 0
+    if scenario == 'race':
+        pre_roof_score = aero_score - friction_penalty
+    elif scenario == 'cargo':
+        pre_roof_score = cargo_score - cost_penalty
+    elif scenario == 'offroad':
+        pre_roof_score = offroad_score
+    elif scenario == 'city':
+        pre_roof_score = fuel_efficiency - weight - cost_penalty
+
+    roof_score = 0
+    for module in has_modules:
+        if module == "solar-panel":
+            roof_score += 10 if (scenario == "city" or scenario == "offroad") else -5
+        elif module == "cargo-box":
+            roof_score += 10 if (scenario == "cargo" or scenario == "offroad") else -5
+        elif module == "big-cargo-box":
+            roof_score += 15 if scenario == "cargo" else -10
+
+    # dodatkowa nagroda za połączone duże skrzynie
+    if has_modules == ["big-cargo-box", "big-cargo-box", "big-cargo-box"] and \
+       scenario == "cargo":
+        roof_score += 20
+    elif has_modules[:-1] == ["big-cargo-box", "big-cargo-box"] or \
+       has_modules[1:] == ["big-cargo-box", "big-cargo-box"] and \
+       scenario == "cargo":
+        roof_score += 10
+
+    # penalize unused poles (extra weight without benefit) no matter the car type
+    unused_poles = has_modules.count(None) - (3-has_poles)
+    roof_score -= unused_poles * 5
+
+    return pre_roof_score + roof_score
+
+# one vehicle = one record of this dtype (41 bytes), a population is a structured array of them
+# and every field works as a column: population["body_width"], population["modules"] (n, 3), ...
+# module_count - how long the has_modules list really is (crossover can make it shorter than 3, and evaluate depends on that)
+GENOME_DTYPE = np.dtype([
+    ("vehicle_type", np.int8), # index into VEHICLE_TYPES
+    ("body_width", np.float64),
+    ("body_height", np.float64),
+    ("body_length", np.float64),
+    ("wheel_thickness", np.float64),
+    ("is_red", np.bool_),
+    ("has_spoiler", np.bool_),
+    ("has_bullbar", np.bool_),
+    ("has_poles", np.int8),
+    ("modules", np.int8, (MAX_POLES,)), # module codes (MODULES), 0 past module_count
+    ("module_count", np.int8),
+])
+
+def genes_to_columns(population):
+    # list of genome dicts -> structured array (GENOME_DTYPE)
+    columns = np.zeros(len(population), dtype=GENOME_DTYPE)
+    module_code = {module: code for code, module in enumerate(MODULES)}
+    for k, genes in enumerate(population):
+        vehicle_type, body_width, body_height, body_length, wheel_thickness, is_red, has_spoiler, has_bullbar, \
+            has_poles, has_modules = unpack_genes(genes)
+        codes = [module_code[module] for module in has_modules]
+        columns[k] = (VEHICLE_TYPES.index(vehicle_type), body_width, body_height, body_length, wheel_thickness,
+                      is_red, has_spoiler, has_bullbar, has_poles, codes + [NO_MODULE] * (MAX_POLES - len(codes)), len(codes))
+    return columns
+
+def genes_from_record(record):
+    # one GENOME_DTYPE record -> the nested dict load_vehicle / evaluate work with
+    return {
+        "binary": {name: bool(record[name]) for name in ("is_red", "has_spoiler", "has_bullbar")},
+        "continuous": {name: float(record[name]) for name in ("body_width", "body_height", "body_length", "wheel_thickness")},
+        "vehicle_type": VEHICLE_TYPES[record["vehicle_type"]],
+        "roof_rack": {
+            "has_poles": int(record["has_poles"]),
+            "has_modules": [MODULES[code] for code in record["modules"][:record["module_count"]]],
+        },
+    }
+
+def score_terms(columns):
+    # everything evaluate computes before looking at the scenario, same operations in the same order
+    # (so the floats come out bit for bit the same), the bools count as 0/1 like in python
+    width, height, length = columns["body_width"], columns["body_height"], columns["body_length"]
+    wheel_thickness = columns["wheel_thickness"]
+    is_red = columns["is_red"].astype(np.int64)
+    has_spoiler = columns["has_spoiler"].astype(np.int64)
+    has_bullbar = columns["has_bullbar"].astype(np.int64)
+    volume = width * height * length
+
+    aero_score = (length / width) * (length / height) * 10 + is_red * 5 + has_spoiler * 5 - has_bullbar * 5
+    # the original weight parses as (volume + wheel_thickness + 10) if has_spoiler else (11 if has_bullbar else 1)
+    weight = np.where(columns["has_spoiler"], volume + wheel_thickness + 10, np.where(columns["has_bullbar"], 11, 1))
+    return {
+        "aero_score": aero_score,
+        "fuel_efficiency": -volume + aero_score * 0.5,
+        "weight": weight,
+        "friction_penalty": wheel_thickness * 10,
+        "cargo_score": volume,
+        "offroad_score": wheel_thickness * 15 + has_bullbar * 10,
+        "cost_penalty": has_spoiler * 10 + has_bullbar * 10,
+    }
+
+# roof module points per scenario, indexed by module code
+MODULE_POINTS = {
+    "race": np.array([0, -5, -5, -10]),
+    "cargo": np.array([0, -5, 10, 15]),
+    "offroad": np.array([0, 10, 10, -10]),
+    "city": np.array([0, 10, -5, -10]),
+}
+OTHER_MODULE_POINTS = np.array([0, -5, -5, -10]) # any other scenario name
+
+def roof_scores(columns, scenario):
+    # slot by slot - a slot only counts if it's in the has_modules list (slot < module_count)
+    modules, module_count = columns["modules"], columns["module_count"]
+    points = MODULE_POINTS.get(scenario, OTHER_MODULE_POINTS)
+    roof_score = np.zeros(len(modules), dtype=np.int64)
+    empty_slots = np.zeros(len(modules), dtype=np.int64)
+    big = []
+    for slot in range(MAX_POLES):
+        in_list = module_count > slot
+        code = modules[:, slot]
+        roof_score += np.where(in_list, np.take(points, code), 0)
+        empty_slots += in_list & (code == NO_MODULE)
+        big.append(code == BIG_CARGO_BOX)
+
+    # the big cargo box bonus - both slices only match a full list of 3, and the 'and' binds tighter than the 'or'
+    full = module_count == MAX_POLES
+    all_big = full & big[0] & big[1] & big[2]
+    front_pair, back_pair = full & big[0] & big[1], full & big[1] & big[2]
+    cargo = scenario == "cargo"
+    roof_score += np.where(all_big & cargo, 20, np.where(front_pair | (back_pair & cargo), 10, 0))
+
+    unused_poles = empty_slots - (MAX_POLES - columns["has_poles"].astype(np.int64))
+    return roof_score - unused_poles * 5
+
+def pre_roof_scores(terms, scenario):
+    if scenario == "race":
+        return terms["aero_score"] - terms["friction_penalty"]
+    if scenario == "cargo":
+        return terms["cargo_score"] - terms["cost_penalty"]
+    if scenario == "offroad":
+        return terms["offroad_score"]
+    if scenario == "city":
+        return terms["fuel_efficiency"] - terms["weight"] - terms["cost_penalty"]
+    return np.zeros(len(terms["aero_score"]))
+
+def evaluate_batch(columns, scenario, terms=None):
+    # terms - score_terms(columns), when several scenarios are scored for the same columns
+    if terms is None:
+        terms = score_terms(columns)
+    return pre_roof_scores(terms, scenario) + roof_scores(columns, scenario)
+
+def evaluate_scenarios(columns):
+    # (n, len(SCENARIOS)) - the score of every vehicle in every scenario
+    terms = score_terms(columns)
+    return np.stack([evaluate_batch(columns, scenario, terms) for scenario in SCENARIOS], axis=1)
+
+def random_genome():
+    # any genome the GA can produce, including the short has_modules lists crossover makes
+    has_poles = random.randint(0, 3)
+    module_count = random.choice([has_poles, 3, random.randint(0, 3)])
+    return {
+        "binary": {name: random.random() < 0.5 for name in ("is_red", "has_spoiler", "has_bullbar")},
+        "continuous": {name: random.uniform(0.4, 1.8) for name in ("body_width", "body_height", "body_length", "wheel_thickness")},
+        "vehicle_type": random.choice(VEHICLE_TYPES),
+        "roof_rack": {
+            "has_poles": has_poles,
+            # extra big cargo boxes, so the bonus cases come up often
+            "has_modules": [random.choice(MODULES + ["big-cargo-box"] * 2) for _ in range(module_count)],
+        },
+    }
+
+def verify(population_size, seed):
+    # evaluate_batch has to give exactly what evaluate gives, for every genome and scenario
+    random.seed(seed)
+    population = [random_genome() for _ in range(population_size)]
+    columns = genes_to_columns(population)
+    for scenario in SCENARIOS + ["unknown"]:
+        expected = np.array([evaluate(genes, scenario) for genes in population], dtype=np.float64)
+        if not np.array_equal(evaluate_batch(columns, scenario), expected):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="score a random population with the batched evaluator")
+    parser.add_argument("--population", type=int, default=100000)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="race")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="compare against the scalar evaluate instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.population, args.seed)
+        print("evaluate_batch matches evaluate" if ok else "MISMATCH between evaluate_batch and evaluate")
+        raise SystemExit(0 if ok else 1)
+
+    random.seed(args.seed)
+    population = [random_genome() for _ in range(args.population)]
+    columns = genes_to_columns(population)
+
+    start = time.perf_counter()
+    scores = [evaluate(genes, args.scenario) for genes in population]
+    scalar = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_scores = evaluate_batch(columns, args.scenario)
+    batch = time.perf_counter() - start
+    print(f"{args.population} vehicles: evaluate {scalar:.3f}s, evaluate_batch {batch:.4f}s ({scalar / batch:.0f}x), "
+          f"same scores: {np.array_equal(batch_scores, scores)}")
+
+if __name__ == "__main__":
+    main()
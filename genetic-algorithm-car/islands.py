@@ -0,0 +1,183 @@
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from engine import Evolution
+from fitness import SCENARIOS
+from population import random_population
+
+# island model - k populations evolve on their own (engine.Evolution, each with its own rng) in worker processes,
+# and every `interval` generations the best `migrants` of every island move to its neighbours, where they take
+# the place of the worst ones:
+#   ring - island i sends to island i + 1
+#   full - every island gets the best `migrants` of all the other islands' migrants together
+#
+# an epoch (the generations between two migrations) is one task per island, the islands go to the workers and
+# come back pickled. the migration happens on scored populations (after evaluate, before breed), so the migrants
+# keep their scores. the run only depends on the seed - workers=0 (all in this process) gives the same result
+#
+# IslandModel.run yields the stats of every generation like Evolution.run (the best over the islands),
+# so final.py / evolve.py can use either of them
+#
+# python islands.py --scenario cargo --islands 8 --population 20000 --generations 60 --compare
+# python islands.py --islands 4 --population 5000 --generations 20 --verify
+
+TOPOLOGIES = ["ring", "full"]
+
+def run_epoch(evolution, generations):
+    # in a worker: evaluate the islands population, breed, evaluate, ... ends with a scored population
+    stats = []
+    for _ in range(generations):
+        if evolution.scores is not None:
+            evolution.breed()
+        stats.append(evolution.evaluate())
+    return evolution, stats
+
+def migrants_of(evolution, count):
+    # indices of the best `count` vehicles, the best first
+    return np.argsort(-evolution.scores, kind="stable")[:count]
+
+class IslandModel:
+    def __init__(self, islands, island_size, seed=None, scenario="race", interval=5, migrants=2, topology="ring",
+                 workers=None, tournament_size=3, mutation_rate=0.2):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"unknown topology {topology!r}, one of {TOPOLOGIES}")
+        if migrants >= island_size:
+            raise ValueError(f"{migrants} migrants from islands of {island_size}")
+        self.interval = interval
+        self.migrants = migrants
+        self.topology = topology
+        self.islands = []
+        for island_seed in np.random.SeedSequence(seed).spawn(islands):
+            rng = np.random.default_rng(island_seed)
+            self.islands.append(Evolution(random_population(island_size, rng), rng, scenario,
+                                          tournament_size=tournament_size, mutation_rate=mutation_rate))
+        # workers=0 - no processes, the epochs run one after another right here
+        self.executor = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+        self.generation = 0
+
+    @property
+    def best(self):
+        return max((island.best for island in self.islands if island.best), key=lambda best: best[0], default=None)
+
+    def epoch(self, generations):
+        # all islands for `generations` generations, returns the stats of every island
+        if self.executor is None:
+            results = [run_epoch(island, generations) for island in self.islands]
+        else:
+            futures = [self.executor.submit(run_epoch, island, generations) for island in self.islands]
+            results = [future.result() for future in futures]
+        self.islands = [island for island, _ in results]
+        return [stats for _, stats in results]
+
+    def migrate(self):
+        # everyone's migrants are picked before anyone receives any
+        outgoing = [migrants_of(island, self.migrants) for island in self.islands]
+        population = [np.take(island.population, indices) for island, indices in zip(self.islands, outgoing)]
+        scores = [island.scores[indices] for island, indices in zip(self.islands, outgoing)]
+
+        k = len(self.islands)
+        for target, island in enumerate(self.islands):
+            if self.topology == "ring":
+                incoming, incoming_scores = population[target - 1], scores[target - 1]
+            else:
+                others = [source for source in range(k) if source != target]
+                pooled = np.concatenate([population[source] for source in others])
+                pooled_scores = np.concatenate([scores[source] for source in others])
+                best = np.argsort(-pooled_scores, kind="stable")[:self.migrants]
+                incoming, incoming_scores = np.take(pooled, best), pooled_scores[best]
+
+            worst = np.argsort(island.scores, kind="stable")[:len(incoming)]
+            island.population[worst] = incoming
+            island.scores[worst] = incoming_scores
+
+    def run(self, generations):
+        while generations > 0:
+            epoch = min(self.interval, generations)
+            island_stats = self.epoch(epoch)
+            generations -= epoch
+            if generations > 0 and len(self.islands) > 1:
+                self.migrate()
+
+            for g in range(epoch):
+                stats = [island[g] for island in island_stats]
+                best = max(range(len(stats)), key=lambda i: stats[i]["best_score"])
+                yield {
+                    "generation": self.generation,
+                    "best_score": stats[best]["best_score"],
+                    "mean_score": float(np.mean([s["mean_score"] for s in stats])), # the islands are the same size
+                    "worst_score": min(s["worst_score"] for s in stats),
+                    "unique": None,
+                    "best": stats[best]["best"],
+                    "island": best,
+                    "island_best_scores": [s["best_score"] for s in stats],
+                    "evaluate_s": sum(s["evaluate_s"] for s in stats),
+                }
+                self.generation += 1
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="run the car GA as an island model")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="cargo")
+    parser.add_argument("--islands", type=int, default=4)
+    parser.add_argument("--population", type=int, default=20000, help="vehicles per island")
+    parser.add_argument("--generations", type=int, default=40)
+    parser.add_argument("--interval", type=int, default=5, help="generations between migrations")
+    parser.add_argument("--migrants", type=int, default=2)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (0 - all in this process)")
+    parser.add_argument("--mutation-rate", type=float, default=0.2)
+    parser.add_argument("--tournament-size", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stats", help="per-generation stats (JSON lines)")
+    parser.add_argument("--compare", action="store_true",
+                        help="also run one population of islands * population in this process")
+    parser.add_argument("--verify", action="store_true", help="check that the workers give the same run as workers=0")
+    args = parser.parse_args()
+
+    def island_run(workers):
+        with IslandModel(args.islands, args.population, args.seed, args.scenario, args.interval, args.migrants,
+                         args.topology, workers, args.tournament_size, args.mutation_rate) as model:
+            start = time.perf_counter()
+            history = list(model.run(args.generations))
+            return history, model.best, time.perf_counter() - start
+
+    history, best, elapsed = island_run(args.workers)
+    vehicles = args.islands * args.population * args.generations
+    print(f"{args.islands} islands ({args.topology}): best {best[0]:.3f} in {elapsed:.2f}s ({vehicles / elapsed:,.0f} vehicles/s)")
+    if args.stats:
+        with open(args.stats, "w") as f:
+            for stats in history:
+                f.write(json.dumps(stats) + "\n")
+
+    if args.compare:
+        rng = np.random.default_rng(args.seed)
+        evolution = Evolution(random_population(args.islands * args.population, rng), rng, args.scenario,
+                              tournament_size=args.tournament_size, mutation_rate=args.mutation_rate)
+        start = time.perf_counter()
+        for _ in evolution.run(args.generations):
+            pass
+        single = time.perf_counter() - start
+        print(f"one population: best {evolution.best[0]:.3f} in {single:.2f}s ({vehicles / single:,.0f} vehicles/s)")
+
+    if args.verify:
+        serial_history, serial_best, _ = island_run(0)
+        same = lambda a, b: {key: value for key, value in a.items() if not key.endswith("_s")} == \
+                            {key: value for key, value in b.items() if not key.endswith("_s")}
+        ok = serial_best == best and all(same(a, b) for a, b in zip(history, serial_history))
+        print("workers match the in-process run" if ok else "MISMATCH between the workers and the in-process run")
+        raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import time
+import numpy as np
+
+from fitness import SCENARIOS, evaluate_scenarios, genes_from_record
+from population import next_generation, random_population
+
+# multi-objective mode (NSGA-II) - every vehicle gets all four scenario scores in one pass (evaluate_scenarios),
+# and instead of one best vehicle the run keeps the Pareto front: the vehicles no other vehicle beats in every
+# scenario at once. one run gives the whole trade-off between race / cargo / offroad / city
+#
+# every generation: children from the usual operators (population.next_generation, with the tournaments
+# deciding by front and then crowding distance), parents + children sorted into fronts, and the best
+# population_size of them survive - whole fronts first, the last one cut by crowding distance
+#
+# the sort compares every vehicle with every other one, so it's meant for populations of a few thousand
+#
+# python pareto.py --population 2000 --generations 100
+# python pareto.py --population 300 --verify
+
+def dominates(a, b):
+    # (len(a), len(b)) - a[i] dominates b[j]: at least as good in every objective and better in one (all maximized)
+    at_least = np.ones((len(a), len(b)), dtype=bool)
+    better = np.zeros((len(a), len(b)), dtype=bool)
+    for m in range(a.shape[1]):
+        at_least &= a[:, None, m] >= b[None, :, m]
+        better |= a[:, None, m] > b[None, :, m]
+    return at_least & better
+
+def non_dominated_sort(objectives, chunk_size=512):
+    # front of every vehicle (0 - the Pareto front). the dominance matrix is never built whole, only chunk_size
+    # rows of it at a time: first the count of vehicles dominating each one, then the fronts are peeled off -
+    # whatever isn't dominated by anything left is the next front.
+    # sorted best first in the first objective, then the second, ... a vehicle can only be dominated by the ones
+    # before it, so only half of the matrix is needed
+    n = len(objectives)
+    order = np.lexsort(tuple(-objectives[:, m] for m in reversed(range(objectives.shape[1]))))
+    ordered = objectives[order]
+
+    dominated_by = np.zeros(n, dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        dominated_by[start:] += np.count_nonzero(dominates(ordered[start:start + chunk_size], ordered[start:]), axis=0)
+
+    rank = np.full(n, -1, dtype=np.int64)
+    front = np.flatnonzero(dominated_by == 0)
+    r = 0
+    while len(front):
+        rank[front] = r
+        for start in range(0, len(front), chunk_size):
+            rows = front[start:start + chunk_size]
+            dominated_by[rows[0]:] -= np.count_nonzero(dominates(ordered[rows], ordered[rows[0]:]), axis=0)
+        front = np.flatnonzero((dominated_by == 0) & (rank < 0))
+        r += 1
+
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = rank
+    return ranks
+
+def crowding_distance(objectives, rank):
+    # for every front and objective: the vehicles sorted by it, the two ends get inf, the others the gap
+    # between their neighbours over the range of the front. all fronts at once
+    n, n_objectives = objectives.shape
+    distance = np.zeros(n)
+    for m in range(n_objectives):
+        order = np.lexsort((objectives[:, m], rank))
+        values, ranks = objectives[order, m], rank[order]
+        starts = np.flatnonzero(np.r_[True, ranks[1:] != ranks[:-1]])
+        ends = np.r_[starts[1:], n] - 1
+        span = np.repeat(values[ends] - values[starts], np.diff(np.r_[starts, n]))
+
+        gap = np.zeros(n)
+        gap[1:-1] = values[2:] - values[:-2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gap = np.where(span > 0, gap / span, 0.0)
+        gap[starts] = np.inf
+        gap[ends] = np.inf
+        distance[order] += gap
+    return distance
+
+def crowded_order(rank, distance):
+    # best first: lower front, then the larger crowding distance
+    return np.lexsort((-distance, rank))
+
+class ParetoEvolution:
+    # scenarios - the objectives, any of fitness.SCENARIOS
+    def __init__(self, population, rng, scenarios=SCENARIOS, tournament_size=2, mutation_rate=0.2):
+        self.population = population
+        self.rng = rng
+        self.scenarios = list(scenarios)
+        self.columns = [SCENARIOS.index(scenario) for scenario in self.scenarios]
+        self.tournament_size = tournament_size
+        self.mutation_rate = mutation_rate
+        self.generation = 0
+        self.objectives = self.evaluate(population)
+        self.rank = non_dominated_sort(self.objectives)
+        self.distance = crowding_distance(self.objectives, self.rank)
+
+    def evaluate(self, population):
+        return evaluate_scenarios(population)[:, self.columns]
+
+    def step(self):
+        start = time.perf_counter()
+        # the crowded comparison as one score, so the usual tournaments can use it
+        size = len(self.population)
+        fitness = np.empty(size)
+        fitness[crowded_order(self.rank, self.distance)] = np.arange(size, 0, -1)
+        children = next_generation(self.population, fitness, self.rng, self.tournament_size, self.mutation_rate)
+        bred = time.perf_counter()
+        child_objectives = self.evaluate(children)
+        evaluated = time.perf_counter()
+
+        # parents + children, the best half survives
+        population = np.concatenate([self.population, children])
+        objectives = np.concatenate([self.objectives, child_objectives])
+        rank = non_dominated_sort(objectives)
+        distance = crowding_distance(objectives, rank)
+        survivors = crowded_order(rank, distance)[:size]
+        self.population = np.take(population, survivors)
+        self.objectives = objectives[survivors]
+        # the fronts of the survivors stay the same, only the crowding of the cut front changes
+        self.rank = rank[survivors]
+        self.distance = crowding_distance(self.objectives, self.rank)
+        self.generation += 1
+
+        front = self.rank == 0
+        return {
+            "generation": self.generation - 1,
+            "front_size": int(np.count_nonzero(front)),
+            "fronts": int(self.rank.max()) + 1,
+            "best_scores": {scenario: float(self.objectives[:, m].max()) for m, scenario in enumerate(self.scenarios)},
+            "breed_s": bred - start,
+            "evaluate_s": evaluated - bred,
+            "sort_s": time.perf_counter() - evaluated,
+        }
+
+    def run(self, generations):
+        for _ in range(generations):
+            yield self.step()
+
+    def front(self):
+        # the Pareto front without copies: [(scores per scenario, genes)], best in the first scenario first
+        indices = np.flatnonzero(self.rank == 0)
+        _, unique = np.unique(self.population[indices].view(f"V{self.population.dtype.itemsize}"), return_index=True)
+        indices = indices[unique]
+        indices = indices[np.argsort(-self.objectives[indices, 0], kind="stable")]
+        return [(dict(zip(self.scenarios, self.objectives[k].tolist())), genes_from_record(self.population[k]))
+                for k in indices]
+
+def naive_sort(objectives):
+    # the textbook version, to check the fast one
+    n = len(objectives)
+    beats = lambda p, q: all(objectives[p] >= objectives[q]) and any(objectives[p] > objectives[q])
+    rank = [-1] * n
+    r = 0
+    while -1 in rank:
+        front = [p for p in range(n) if rank[p] < 0 and not any(rank[q] < 0 and beats(q, p) for q in range(n))]
+        for p in front:
+            rank[p] = r
+        r += 1
+    return np.array(rank)
+
+def naive_crowding(objectives, rank):
+    distance = np.zeros(len(objectives))
+    for r in range(rank.max() + 1):
+        front = np.flatnonzero(rank == r)
+        for m in range(objectives.shape[1]):
+            ordered = front[np.argsort(objectives[front, m], kind="stable")]
+            low, high = objectives[ordered[0], m], objectives[ordered[-1], m]
+            distance[ordered[0]] = distance[ordered[-1]] = np.inf
+            for k in range(1, len(ordered) - 1):
+                if high > low:
+                    distance[ordered[k]] += (objectives[ordered[k + 1], m] - objectives[ordered[k - 1], m]) / (high - low)
+    return distance
+
+def verify(population_size, seed):
+    rng = np.random.default_rng(seed)
+    # real scores, and small integers with lots of ties
+    for objectives in (evaluate_scenarios(random_population(population_size, rng)),
+                       rng.integers(0, 5, (population_size, 3)).astype(np.float64)):
+        rank = non_dominated_sort(objectives, chunk_size=37)
+        if not np.array_equal(rank, naive_sort(objectives)):
+            return False
+        if not np.allclose(crowding_distance(objectives, rank), naive_crowding(objectives, rank)):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="evolve the Pareto front over the scenarios (NSGA-II)")
+    parser.add_argument("--population", type=int, default=2000)
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated objectives")
+    parser.add_argument("--mutation-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true", help="check the sort and the crowding distance against the textbook versions")
+    args = parser.parse_args()
+
+    if args.verify:
+        ok = verify(args.population, args.seed)
+        print("fast sort and crowding match the textbook versions" if ok else "MISMATCH in the sort or the crowding distance")
+        raise SystemExit(0 if ok else 1)
+
+    rng = np.random.default_rng(args.seed)
+    evolution = ParetoEvolution(random_population(args.population, rng), rng, args.scenarios.split(","),
+                                mutation_rate=args.mutation_rate)
+    start = time.perf_counter()
+    for stats in evolution.run(args.generations):
+        print(f"generation {stats['generation']:>4}: front of {stats['front_size']:>5}, {stats['fronts']:>3} fronts, best " +
+              "  ".join(f"{scenario} {score:.2f}" for scenario, score in stats["best_scores"].items()))
+    print(f"{args.generations} generations in {time.perf_counter() - start:.2f}s")
+    for scores, genes in evolution.front()[:10]:
+        print({scenario: round(score, 2) for scenario, score in scores.items()}, genes["vehicle_type"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import time
+import numpy as np
+
+from fitness import GENOME_DTYPE, MAX_POLES, MODULES, NO_MODULE, VEHICLE_TYPES, evaluate_batch, genes_from_record
+
+# the GA operators on whole populations - a population is a structured array (fitness.GENOME_DTYPE),
+# 41 bytes per vehicle instead of a few nested dicts and lists, and every operator returns a new array
+# (no child shares anything with its parents, unlike the shallow genes.copy() in the dict version)
+#
+# same distributions as create_random_genes / mutate / crossover in the original final.py.
+# (pick rows with np.take(population, indices) - for structured arrays it's many times faster than population[indices])
+#
+# next_generation is a whole GA generation (selection, crossover, mutation) as a few array operations:
+# python population.py --population 100000 --generations 20
+
+BINARY_GENES = ["is_red", "has_spoiler", "has_bullbar"]
+CONTINUOUS_GENES = ["body_width", "body_height", "body_length", "wheel_thickness"]
+
+def random_population(size, rng):
+    population = np.zeros(size, dtype=GENOME_DTYPE)
+    population["vehicle_type"] = rng.integers(0, len(VEHICLE_TYPES), size)
+    for name in CONTINUOUS_GENES:
+        population[name] = rng.uniform(0.75, 1.5, size)
+    for name in BINARY_GENES:
+        population[name] = rng.random(size) < 0.5
+
+    # a module (or an empty slot) on every pole, the list is padded with empty slots to 3
+    has_poles = rng.integers(0, MAX_POLES + 1, size)
+    modules = rng.integers(0, len(MODULES), (size, MAX_POLES))
+    population["has_poles"] = has_poles
+    population["modules"] = np.where(np.arange(MAX_POLES) < has_poles[:, None], modules, NO_MODULE)
+    population["module_count"] = MAX_POLES
+    return population
+
+def mutate(population, rng, mutation_rate):
+    mutated = population.copy()
+    size = len(population)
+
+    redraw = rng.random(size) < mutation_rate
+    mutated["vehicle_type"] = np.where(redraw, rng.integers(0, len(VEHICLE_TYPES), size), population["vehicle_type"])
+    for name in CONTINUOUS_GENES:
+        mutated[name] = np.clip(population[name] + rng.uniform(-0.15, 0.15, size), 0.4, 1.8)
+    for name in BINARY_GENES:
+        mutated[name] = population[name] ^ (rng.random(size) < mutation_rate)
+
+    # roof rack - the modules on the (new number of) poles are kept or redrawn, the rest is padded with empty slots to 3
+    has_poles = np.clip(population["has_poles"] + rng.integers(-1, 2, size), 0, MAX_POLES)
+    kept = np.arange(MAX_POLES) < np.minimum(population["module_count"], has_poles)[:, None]
+    redraw = rng.random((size, MAX_POLES)) < mutation_rate
+    modules = np.where(redraw, rng.integers(0, len(MODULES), (size, MAX_POLES)), population["modules"])
+    mutated["has_poles"] = has_poles
+    mutated["modules"] = np.where(kept, modules, NO_MODULE)
+    mutated["module_count"] = MAX_POLES
+    return mutated
+
+# the genes crossover picks from one parent or the other, and which of them every byte of a record belongs to
+# (-1 for the roof modules, they're worked out separately)
+CROSSOVER_GENES = ["vehicle_type"] + BINARY_GENES + CONTINUOUS_GENES + ["has_poles"]
+_GENE_OF_BYTE = np.full(GENOME_DTYPE.itemsize, -1)
+for _gene, _name in enumerate(CROSSOVER_GENES):
+    _offset = GENOME_DTYPE.fields[_name][1]
+    _GENE_OF_BYTE[_offset:_offset + GENOME_DTYPE[_name].itemsize] = _gene
+
+def crossover(parents1, parents2, rng):
+    # child k from parents1[k] and parents2[k], every gene picked from one of them at random.
+    # the records are blended as raw bytes in one go - one coin per gene, spread over the bytes of that gene
+    size = len(parents1)
+    from_first = rng.integers(0, 2, (size, len(CROSSOVER_GENES)), dtype=bool)
+    # (0xff where the byte comes from the first parent, blended with xor - np.where is slow on a coin-flip mask)
+    byte_mask = -from_first[:, np.maximum(_GENE_OF_BYTE, 0)].view(np.int8)
+    raw1 = np.ascontiguousarray(parents1).view(np.uint8).reshape(size, -1)
+    raw2 = np.ascontiguousarray(parents2).view(np.uint8).reshape(size, -1)
+    children = (raw2 ^ ((raw1 ^ raw2) & byte_mask.view(np.uint8))).view(GENOME_DTYPE).reshape(size)
+
+    # modules on the child's poles: from either parent if both have one in that slot, from the one that has it
+    # otherwise, empty if neither does. the list isn't padded, so it's only has_poles long
+    slots = np.arange(MAX_POLES)
+    valid1 = slots < np.minimum(parents1["module_count"], parents1["has_poles"])[:, None]
+    valid2 = slots < np.minimum(parents2["module_count"], parents2["has_poles"])[:, None]
+    pick1 = np.where(valid1 & valid2, rng.integers(0, 2, (size, MAX_POLES), dtype=bool), valid1)
+    modules = np.where(pick1, parents1["modules"], np.where(valid2, parents2["modules"], NO_MODULE))
+    children["modules"] = np.where(slots < children["has_poles"][:, None], modules, NO_MODULE)
+    children["module_count"] = children["has_poles"]
+    return children
+
+def tournament_selection(scores, tournament_size, n_parents, rng):
+    # indices of the winners of n_parents tournaments, all of them drawn as one (n_parents, tournament_size) matrix.
+    # the contestants of a tournament are all different (random.sample), rows with a repeat are just drawn again -
+    # with tournaments much smaller than the population that's a handful of rows
+    size = len(scores)
+    if tournament_size > size:
+        raise ValueError(f"tournament of {tournament_size} in a population of {size}")
+    tournaments = rng.integers(0, size, (n_parents, tournament_size))
+    redraw = np.arange(n_parents)
+    while len(redraw):
+        rows = tournaments[redraw]
+        repeated = np.zeros(len(redraw), dtype=bool)
+        for a in range(tournament_size):
+            for b in range(a + 1, tournament_size):
+                repeated |= rows[:, a] == rows[:, b]
+        redraw = redraw[repeated]
+        tournaments[redraw] = rng.integers(0, size, (len(redraw), tournament_size))
+
+    # argmax takes the first of equal scores, like max() over the tournament
+    winners = np.argmax(scores[tournaments], axis=1)
+    return tournaments[np.arange(n_parents), winners]
+
+def parent_pairs(n_parents, n_children, rng):
+    # two different parents (positions in the parent list) for every child, like random.sample(parents, 2)
+    if n_parents < 2:
+        raise ValueError("at least two parents are needed")
+    first = rng.integers(0, n_parents, n_children)
+    second = rng.integers(0, n_parents - 1, n_children)
+    second += second >= first
+    return first, second
+
+def next_generation(population, scores, rng, tournament_size, mutation_rate):
+    # tournament selection -> crossover of random parent pairs -> mutation of some of the children
+    size = len(population)
+    parents = tournament_selection(scores, tournament_size, size, rng)
+    first, second = parent_pairs(size, size, rng)
+    children = crossover(np.take(population, parents[first]), np.take(population, parents[second]), rng)
+    mutated = np.flatnonzero(rng.random(size) < mutation_rate)
+    children[mutated] = mutate(np.take(children, mutated), rng, mutation_rate)
+    return children
+
+def check(population):
+    # invariants every population has to keep
+    slots = np.arange(MAX_POLES)
+    return bool(
+        np.all((population["has_poles"] >= 0) & (population["has_poles"] <= MAX_POLES)) and
+        np.all((population["module_count"] >= 0) & (population["module_count"] <= MAX_POLES)) and
+        np.all((population["modules"] >= 0) & (population["modules"] < len(MODULES))) and
+        np.all(population["modules"][slots >= population["module_count"][:, None]] == NO_MODULE) and
+        all(np.all((population[name] >= 0.4) & (population[name] <= 1.8)) for name in CONTINUOUS_GENES)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="time the population operators")
+    parser.add_argument("--population", type=int, default=100000)
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--mutation-rate", type=float, default=0.2)
+    parser.add_argument("--tournament-size", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    population = random_population(args.population, rng)
+    print(f"{GENOME_DTYPE.itemsize} bytes per vehicle, {population.nbytes / 2**20:.1f} MB for {args.population}")
+
+    start = time.perf_counter()
+    for _ in range(args.generations):
+        scores = evaluate_batch(population, "race")
+        population = next_generation(population, scores, rng, args.tournament_size, args.mutation_rate)
+        if not check(population):
+            raise SystemExit("broken population")
+    elapsed = time.perf_counter() - start
+    print(f"{args.generations} generations in {elapsed:.3f}s ({1000 * elapsed / args.generations:.1f} ms per generation)")
+    print("best of the last one:", genes_from_record(population[np.argmax(evaluate_batch(population, "race"))]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from cache import CachedEvaluator, FitnessCache
+from evaluators import InProcessEvaluator
+from population import random_population
+
+def other_fitness(population, scenario):
+    # another fitness function - the closed-form scores plus one
+    return InProcessEvaluator()(population, scenario) + 1
+
+def saved_cache(path, fitness):
+    evaluator = CachedEvaluator(InProcessEvaluator(fitness), FitnessCache(fitness=fitness))
+    evaluator(random_population(200, np.random.default_rng(0)), "race")
+    evaluator.cache.save(str(path))
+
+def test_saved_cache_loads_for_the_same_fitness(tmp_path):
+    saved_cache(tmp_path / "cache.npz", other_fitness)
+    cache = FitnessCache(fitness=other_fitness)
+    cache.load(str(tmp_path / "cache.npz"))
+    assert len(cache) == 200
+
+def test_saved_cache_refuses_another_fitness(tmp_path):
+    saved_cache(tmp_path / "cache.npz", other_fitness)
+    with pytest.raises(ValueError, match="test_cache.other_fitness"):
+        FitnessCache().load(str(tmp_path / "cache.npz"))
+    with pytest.raises(ValueError):
+        FitnessCache(fitness="rollout-v2").load(str(tmp_path / "cache.npz"))
@@ -0,0 +1,54 @@
+import json
+import shutil
+import sys
+
+import numpy as np
+
+import evolve
+from checkpoint import load_checkpoint, save_checkpoint, without_timings
+from engine import Evolution
+from population import random_population
+
+# checkpoint.py --verify as a test: a run stopped halfway and resumed from its checkpoint is the same run
+
+def new_evolution(seed=0, size=2000):
+    rng = np.random.default_rng(seed)
+    return Evolution(random_population(size, rng), rng, "cargo")
+
+def test_resumed_run_matches_uninterrupted(tmp_path):
+    path = str(tmp_path / "run.npz")
+    evolution = new_evolution()
+    history = list(evolution.run(10))
+
+    first_half = new_evolution()
+    resumed_history = list(first_half.run(5))
+    save_checkpoint(path, first_half)
+    resumed = load_checkpoint(path)
+    resumed_history += list(resumed.run(5))
+
+    assert [without_timings(stats) for stats in resumed_history] == [without_timings(stats) for stats in history]
+    assert resumed.population.tobytes() == evolution.population.tobytes()
+    assert resumed.best == evolution.best
+    assert resumed.rng.bit_generator.state == evolution.rng.bit_generator.state
+
+def run_evolve(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["evolve.py", "--seed", "3", "--population", "500", "--quiet", *args])
+    evolve.main()
+
+def stats_lines(path):
+    with open(path) as f:
+        return [without_timings(json.loads(line)) for line in f]
+
+def test_evolve_resume_rewrites_the_stats_after_the_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    run_evolve(monkeypatch, "--generations", "12", "--stats", "full.jsonl")
+
+    # killed after generation 8 with the last checkpoint at 5: the stats file is 3 generations ahead of it
+    run_evolve(monkeypatch, "--generations", "5", "--checkpoint", "run.npz", "--checkpoint-every", "5", "--stats", "run.jsonl")
+    shutil.copy("run.npz", "at-5.npz")
+    run_evolve(monkeypatch, "--generations", "8", "--checkpoint", "run.npz", "--resume", "--stats", "run.jsonl")
+    shutil.copy("at-5.npz", "run.npz")
+    assert len(stats_lines("run.jsonl")) == 8
+
+    run_evolve(monkeypatch, "--generations", "12", "--checkpoint", "run.npz", "--resume", "--stats", "run.jsonl")
+    assert stats_lines("run.jsonl") == stats_lines("full.jsonl")
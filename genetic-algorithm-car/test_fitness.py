@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from fitness import SCENARIOS, evaluate, evaluate_batch, genes_from_record, verify
+from population import next_generation, random_population
+
+# fitness.py --verify as a test: evaluate_batch gives exactly what evaluate gives
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_matches_evaluate(seed):
+    assert verify(2000, seed)
+
+def test_batch_matches_evaluate_after_crossover():
+    # a few generations of the real operators, so the short has_modules lists come from crossover itself
+    rng = np.random.default_rng(4)
+    population = random_population(500, rng)
+    for _ in range(3):
+        population = next_generation(population, evaluate_batch(population, "cargo"), rng, 3, 0.2)
+    assert (population["module_count"] < 3).any()
+    for scenario in SCENARIOS:
+        expected = [evaluate(genes_from_record(record), scenario) for record in population]
+        assert np.array_equal(evaluate_batch(population, scenario), expected)